@@ -0,0 +1,89 @@
+"""Recall@k, query latency and memory of each index backend on synthetic corpora.
+
+    python -m benchmarks.ann_backends --sizes 10000,100000 --dimension 256
+    python -m benchmarks.ann_backends --sizes 1000000 --backends flat,hnsw,ivf_pq --json results.json
+
+Vectors are drawn around random cluster centres (closer to real embeddings
+than uniform noise) and normalised; ground truth comes from exact search.
+"""
+import argparse
+import json
+import time
+
+import faiss
+import numpy as np
+
+from ibelt import index_backends
+
+
+def synthetic_corpus(n, dimension, n_queries, seed=0, clusters=256):
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dimension)).astype("float32")
+    labels = rng.integers(0, clusters, n + n_queries)
+    vectors = centres[labels] + 0.5 * rng.standard_normal((n + n_queries, dimension)).astype("float32")
+    faiss.normalize_L2(vectors)
+    return vectors[:n], vectors[n:]
+
+
+def recall_at_k(found, truth, k):
+    hits = sum(len(set(f[:k]) & set(t[:k])) for f, t in zip(found, truth))
+    return hits / (len(truth) * k)
+
+
+def bench_backend(name, corpus, queries, truth, k):
+    ids = np.arange(len(corpus), dtype="int64")
+    start = time.perf_counter()
+    index, params = index_backends.build(name, corpus, ids)
+    build_seconds = time.perf_counter() - start
+    prepared = index_backends.prepare(name, queries)
+
+    latencies = np.empty(len(queries))
+    found = np.empty((len(queries), k), dtype="int64")
+    for i, query in enumerate(prepared):
+        start = time.perf_counter()
+        _, result = index.search(query.reshape(1, -1), k)
+        latencies[i] = time.perf_counter() - start
+        found[i] = result[0]
+    return {
+        "backend": name,
+        "params": params,
+        "vectors": len(corpus),
+        "build_s": build_seconds,
+        f"recall@{k}": recall_at_k(found, truth, k),
+        "p50_ms": float(np.percentile(latencies, 50) * 1e3),
+        "p99_ms": float(np.percentile(latencies, 99) * 1e3),
+        "memory_mb": faiss.serialize_index(index).nbytes / 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000")
+    parser.add_argument("--dimension", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--backends", default=",".join(index_backends.DEFAULT_PARAMS))
+    parser.add_argument("--threads", type=int, default=1, help="FAISS OpenMP threads")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    faiss.omp_set_num_threads(args.threads)
+    results = []
+    for n in (int(size) for size in args.sizes.split(",")):
+        corpus, queries = synthetic_corpus(n, args.dimension, args.queries)
+        exact = faiss.IndexFlatIP(args.dimension)
+        exact.add(corpus)
+        _, truth = exact.search(queries, args.k)
+        for name in args.backends.split(","):
+            result = bench_backend(name, corpus, queries, truth, args.k)
+            results.append(result)
+            print(f"n={n:>8} {name:>9}: recall@{args.k}={result[f'recall@{args.k}']:.3f} "
+                  f"p50={result['p50_ms']:.3f}ms p99={result['p99_ms']:.3f}ms "
+                  f"mem={result['memory_mb']:.1f}MB build={result['build_s']:.1f}s")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Load test of the chatbot API: N concurrent conversations against a mock LLM.
+
+    python -m benchmarks.api_load --conversations 64 --turns 3
+    python -m benchmarks.api_load --bot agente_comercial --conversations 32 --json results.json
+
+Starts the mock OpenAI server and `python -m ibelt serve` pointed at it
+(offline embedder, in-memory session store), then runs `--conversations`
+concurrent conversations, each sending `--turns` messages in a row over
+SSE. Reported: turns per second, time to first token and full reply
+latency (p50/p99) as seen by the client.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import numpy as np
+
+from benchmarks.mock_openai import start_in_process
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PERGUNTAS = [
+    "Como a plataforma garante a segurança dos meus dados?",
+    "Quais tipos de projetos são elegíveis para incentivos fiscais?",
+    "Vocês têm período de teste gratuito?",
+    "Sou a Ana, da Metalúrgica Souza, estamos no lucro real.",
+]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_api(mock_url, port, workers, cache_dir):
+    env = dict(os.environ, OPENAI_BASE_URL=mock_url, OPENAI_API_KEY="mock", IBELT_EMBEDDER="fake",
+               IBELT_SESSION_STORE="memory", IBELT_CACHE_DIR=cache_dir, PYTHONPATH=REPO_DIR)
+    # Roda no diretório temporário: o índice do FAQ do embedder offline é gravado lá
+    process = subprocess.Popen([sys.executable, "-m", "ibelt", "serve", "--port", str(port),
+                                "--workers", str(workers)], env=env, cwd=cache_dir, stdout=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(300):
+        try:
+            if httpx.get(f"{url}/healthz").status_code == 200:
+                return url, process
+        except httpx.TransportError:
+            time.sleep(0.1)
+    process.terminate()
+    raise SystemExit("A API não subiu")
+
+
+async def conversation(http, bot, turns, index):
+    conversation_id = (await http.post(f"/v1/{bot}/conversations")).json()["conversation_id"]
+    timings = []
+    for turn in range(turns):
+        message = PERGUNTAS[(index + turn) % len(PERGUNTAS)]
+        start = time.perf_counter()
+        first = None
+        async with http.stream("POST", f"/v1/{bot}/conversations/{conversation_id}/messages",
+                               json={"message": message}) as response:
+            async for line in response.aiter_lines():
+                if first is None and line.startswith("event: token"):
+                    first = time.perf_counter() - start
+                elif line.startswith("event: error"):
+                    raise RuntimeError(await response.aread())
+        timings.append((first if first is not None else np.nan, time.perf_counter() - start))
+    return timings
+
+
+async def run_load(url, bot, conversations, turns):
+    limits = httpx.Limits(max_connections=conversations, max_keepalive_connections=conversations)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=300.0) as http:
+        # Aquece índice, modelos e pools antes de medir
+        await conversation(http, bot, 1, 0)
+        start = time.perf_counter()
+        results = await asyncio.gather(*(conversation(http, bot, turns, i) for i in range(conversations)))
+        elapsed = time.perf_counter() - start
+    timings = [t for chat in results for t in chat]
+    ttft = np.array([t[0] for t in timings])
+    total = np.array([t[1] for t in timings])
+    return {
+        "bot": bot,
+        "conversations": conversations,
+        "turns": len(timings),
+        "turns_per_s": len(timings) / elapsed,
+        "ttft_p50_ms": float(np.nanpercentile(ttft, 50) * 1e3),
+        "ttft_p99_ms": float(np.nanpercentile(ttft, 99) * 1e3),
+        "reply_p50_ms": float(np.percentile(total, 50) * 1e3),
+        "reply_p99_ms": float(np.percentile(total, 99) * 1e3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bot", default="consultor", choices=["consultor", "agente_comercial"])
+    parser.add_argument("--conversations", type=int, default=64)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=1, help="API worker processes")
+    parser.add_argument("--ttft-ms", type=float, default=200.0)
+    parser.add_argument("--token-ms", type=float, default=10.0)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    mock_url, mock = start_in_process(ttft_ms=args.ttft_ms, token_ms=args.token_ms)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        url, api = start_api(mock_url, free_port(), args.workers, cache_dir)
+        try:
+            result = asyncio.run(run_load(url, args.bot, args.conversations, args.turns))
+        finally:
+            api.terminate()
+            api.wait()
+            mock.terminate()
+    print(f"{result['bot']}: {result['conversations']} conversas, {result['turns']} turnos, "
+          f"{result['turns_per_s']:.1f}/s ttft p50={result['ttft_p50_ms']:.0f}ms "
+          f"p99={result['ttft_p99_ms']:.0f}ms resposta p50={result['reply_p50_ms']:.0f}ms "
+          f"p99={result['reply_p99_ms']:.0f}ms")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Query-embedding latency and bulk throughput: local CPU model vs remote API.
+
+    python -m benchmarks.embedding_backends
+    python -m benchmarks.embedding_backends --backends local --threads 4 --batch 2000
+    python -m benchmarks.embedding_backends --rtt-ms 120 --json results.json
+
+The remote backend is `OpenAIEmbedder` pointed at a local HTTP stand-in for
+the embeddings endpoint, which answers after `--rtt-ms` plus `--per-text-us`
+per input, so runs are repeatable and cost nothing. The local backend is
+`LocalEmbedder` (requires sentence-transformers); its one-off model load is
+reported separately from steady-state latency.
+"""
+import argparse
+import base64
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+from openai import OpenAI
+
+from ibelt.embeddings import LOCAL_EMBEDDING_MODEL, LocalEmbedder, OpenAIEmbedder
+
+REMOTE_DIMENSION = 1536
+
+
+def make_handler(rtt_ms, per_text_us):
+    class EmbeddingsHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+            time.sleep(rtt_ms / 1e3 + per_text_us * len(texts) / 1e6)
+            rng = np.random.default_rng(len(texts))
+            data = []
+            for i in range(len(texts)):
+                vector = rng.standard_normal(REMOTE_DIMENSION).astype("float32")
+                # O SDK pede base64 por padrão quando o numpy está instalado
+                embedding = (base64.b64encode(vector.tobytes()).decode()
+                             if body.get("encoding_format") == "base64" else vector.tolist())
+                data.append({"object": "embedding", "index": i, "embedding": embedding})
+            payload = json.dumps({"object": "list", "data": data, "model": body["model"],
+                                  "usage": {"prompt_tokens": 0, "total_tokens": 0}}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    return EmbeddingsHandler
+
+
+def start_stand_in(rtt_ms, per_text_us):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(rtt_ms, per_text_us))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def sample_texts(n):
+    temas = ["lucro real", "Lei do Bem", "P&D", "FINEP", "incentivos fiscais", "assinatura", "relatórios"]
+    return [f"Pergunta {i}: como funciona {temas[i % len(temas)]} para empresas do setor {i % 13}?"
+            for i in range(n)]
+
+
+def bench_embedder(name, embedder, queries, batch):
+    start = time.perf_counter()
+    embedder.embed_query("aquecimento")
+    first_seconds = time.perf_counter() - start
+
+    latencies = np.empty(len(queries))
+    for i, text in enumerate(queries):
+        start = time.perf_counter()
+        embedder.embed_query(text)
+        latencies[i] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    embedder.embed(batch)
+    bulk_seconds = time.perf_counter() - start
+    return {
+        "backend": name,
+        "model": embedder.model,
+        "first_call_s": first_seconds,
+        "query_p50_ms": float(np.percentile(latencies, 50) * 1e3),
+        "query_p99_ms": float(np.percentile(latencies, 99) * 1e3),
+        "bulk_texts": len(batch),
+        "bulk_texts_per_s": len(batch) / bulk_seconds,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", default="remote,local")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=1000, help="texts in the bulk throughput run")
+    parser.add_argument("--rtt-ms", type=float, default=60.0, help="stand-in round-trip latency")
+    parser.add_argument("--per-text-us", type=float, default=50.0, help="stand-in cost per input text")
+    parser.add_argument("--local-model", default=LOCAL_EMBEDDING_MODEL)
+    parser.add_argument("--local-backend", default="torch", choices=["torch", "onnx"])
+    parser.add_argument("--threads", type=int, default=None, help="local inference threads")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    queries, batch = sample_texts(args.queries), sample_texts(args.batch)
+    results = []
+    for name in args.backends.split(","):
+        if name == "remote":
+            server = start_stand_in(args.rtt_ms, args.per_text_us)
+            client = OpenAI(api_key="bench", base_url=f"http://127.0.0.1:{server.server_port}/v1", max_retries=0)
+            result = bench_embedder(name, OpenAIEmbedder(client), queries, batch)
+            server.shutdown()
+        elif name == "local":
+            embedder = LocalEmbedder(args.local_model, threads=args.threads, backend=args.local_backend)
+            try:
+                result = bench_embedder(name, embedder, queries, batch)
+            except ImportError as e:
+                print(f"local: ignorado ({e})")
+                continue
+        else:
+            raise SystemExit(f"Backend desconhecido: {name}")
+        results.append(result)
+        print(f"{name:>6}: primeira chamada={result['first_call_s']:.2f}s "
+              f"p50={result['query_p50_ms']:.1f}ms p99={result['query_p99_ms']:.1f}ms "
+              f"lote={result['bulk_texts_per_s']:.0f} textos/s")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
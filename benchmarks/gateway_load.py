@@ -0,0 +1,104 @@
+"""Load test of the LLM gateway: many concurrent chats against a local mock server.
+
+    python -m benchmarks.gateway_load --chats 64 --turns 5
+    python -m benchmarks.gateway_load --chats 128 --modes gateway --json results.json
+
+Each chat is a thread (as a Streamlit session is) that streams `--turns`
+replies in a row. `gateway` sends them through the shared `LLMGateway`;
+`per-call` builds a new synchronous `OpenAI` client for every request, as
+the pages used to. Reported per mode: replies per second, time to first
+token and total reply latency (p50/p99), and the TCP connections the mock
+server saw.
+"""
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from openai import OpenAI
+
+from benchmarks.mock_openai import fetch_stats, start_in_process
+from ibelt import llm
+from ibelt.gateway import LLMGateway, SyncClient
+
+MESSAGES = [{"role": "user", "content": "Como funciona a Lei do Bem para empresas no lucro real?"}]
+
+
+def run_chat(make_client, turns):
+    timings = []
+    for _ in range(turns):
+        client = make_client()
+        start = time.perf_counter()
+        first = None
+        for _ in llm.iter_content(client.chat.completions.create(model="gpt-4o", messages=MESSAGES, stream=True)):
+            if first is None:
+                first = time.perf_counter() - start
+        timings.append((first, time.perf_counter() - start))
+    return timings
+
+
+def bench_mode(mode, base_url, chats, turns, max_concurrency):
+    if mode == "gateway":
+        gateway = LLMGateway(api_key="mock", base_url=base_url, max_connections=max_concurrency,
+                             max_concurrency=max_concurrency)
+        client = SyncClient(lambda: gateway)
+        make_client = lambda: client
+    elif mode == "per-call":
+        gateway = None
+        make_client = lambda: OpenAI(api_key="mock", base_url=base_url, max_retries=0)
+    else:
+        raise SystemExit(f"Modo desconhecido: {mode}")
+
+    before = fetch_stats(base_url)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=chats) as pool:
+        timings = [t for chat in pool.map(lambda _: run_chat(make_client, turns), range(chats)) for t in chat]
+    elapsed = time.perf_counter() - start
+    after = fetch_stats(base_url)
+    if gateway is not None:
+        gateway.close()
+
+    ttft = np.array([t[0] for t in timings])
+    total = np.array([t[1] for t in timings])
+    return {
+        "mode": mode,
+        "chats": chats,
+        "replies": len(timings),
+        "replies_per_s": len(timings) / elapsed,
+        "ttft_p50_ms": float(np.percentile(ttft, 50) * 1e3),
+        "ttft_p99_ms": float(np.percentile(ttft, 99) * 1e3),
+        "reply_p50_ms": float(np.percentile(total, 50) * 1e3),
+        "reply_p99_ms": float(np.percentile(total, 99) * 1e3),
+        "connections": after["connections"] - before["connections"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chats", type=int, default=64)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--modes", default="gateway,per-call")
+    parser.add_argument("--max-concurrency", type=int, default=64, help="gateway in-flight limit and pool size")
+    parser.add_argument("--ttft-ms", type=float, default=200.0)
+    parser.add_argument("--token-ms", type=float, default=10.0)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    base_url, server = start_in_process(ttft_ms=args.ttft_ms, token_ms=args.token_ms)
+    results = []
+    for mode in args.modes.split(","):
+        result = bench_mode(mode, base_url, args.chats, args.turns, args.max_concurrency)
+        results.append(result)
+        print(f"{mode:>8}: {result['replies']} respostas, {result['replies_per_s']:.1f}/s "
+              f"ttft p50={result['ttft_p50_ms']:.0f}ms p99={result['ttft_p99_ms']:.0f}ms "
+              f"resposta p50={result['reply_p50_ms']:.0f}ms p99={result['reply_p99_ms']:.0f}ms "
+              f"conexões={result['connections']}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1)
+    server.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""On-disk size, resident memory and accuracy of compressed FAQ index storage.
+
+    python -m benchmarks.index_compression
+    python -m benchmarks.index_compression --backends flat,flat_fp16,pq --replicate 2000 --json results.json
+
+Vectors come from the FAQ index on disk. Queries are the FAQ vectors plus
+Gaussian noise (a stand-in for paraphrased questions), and accuracy is
+measured against exact float32 search: top-1 agreement and recall@k.
+`--replicate` adds jittered copies of the FAQ vectors so the memory numbers
+reflect a corpus larger than the 30 FAQ entries.
+
+Resident memory is measured in a fresh process per variant, from the
+RssAnon (heap) and RssFile (mapped file pages) lines of /proc/self/status,
+once with a normal read and once with the read-only mmap load. Both loads
+must return the same neighbours and reconstructed vectors as the index
+they were written from; a backend whose mmap load fails or disagrees is
+reported and makes the run exit with an error, so every backend is checked
+with `IBELT_INDEX_MMAP=1` on the installed FAISS.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import faiss
+import numpy as np
+
+from ibelt import index_backends
+from ibelt.retriever import INDEX_PATH
+
+
+def faq_vectors(path):
+    index = faiss.read_index(path)
+    if isinstance(index, faiss.IndexIDMap) or faiss.try_extract_index_ivf(index) is not None:
+        return index_backends.make_reconstructor(index)(index_backends.vector_ids(index))
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def corpus_and_queries(vectors, replicate, n_queries, noise, seed=0):
+    rng = np.random.default_rng(seed)
+    scale = np.linalg.norm(vectors, axis=1).mean() / np.sqrt(vectors.shape[1])
+    copies = [vectors] + [vectors + noise * scale * rng.standard_normal(vectors.shape).astype("float32")
+                          for _ in range(replicate)]
+    corpus = np.ascontiguousarray(np.vstack(copies), dtype="float32")
+    rows = rng.integers(0, len(vectors), n_queries)
+    queries = vectors[rows] + noise * scale * rng.standard_normal((n_queries, vectors.shape[1])).astype("float32")
+    return corpus, np.ascontiguousarray(queries, dtype="float32")
+
+
+def _rss_kb():
+    values = {}
+    with open("/proc/self/status", encoding="ascii") as f:
+        for line in f:
+            if line.startswith(("RssAnon:", "RssFile:")):
+                key, value = line.split(":")
+                values[key] = int(value.split()[0])
+    return values
+
+
+def _resident(path, mmap, queries, k):
+    """Runs in a fresh process: loads `path`, searches it and reports RSS growth and the results."""
+    before = _rss_kb()
+    index = index_backends.read_index(path, mmap=mmap)
+    # Uma busca exaustiva toca todas as páginas do índice
+    _, found = index.search(queries, k)
+    after = _rss_kb()
+    ids = index_backends.vector_ids(index)[:8]
+    vectors = index_backends.make_reconstructor(index)(ids)
+    return {key: after[key] - before[key] for key in after}, found, vectors
+
+
+def resident_memory(path, mmap, queries, k):
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+        return pool.submit(_resident, path, mmap, queries, k).result()
+
+
+def bench_variant(name, corpus, queries, truth, k, work_dir):
+    ids = np.arange(len(corpus), dtype="int64")
+    start = time.perf_counter()
+    index, params = index_backends.build(name, corpus, ids)
+    build_seconds = time.perf_counter() - start
+    path = os.path.join(work_dir, f"{name}.index")
+    faiss.write_index(index, path)
+
+    prepared = index_backends.prepare(name, queries)
+    _, found = index.search(prepared, k)
+    expected = index_backends.make_reconstructor(index)(index_backends.vector_ids(index)[:8])
+    loads = {}
+    for mmap in (False, True):
+        # Cada leitura (heap e mmap) tem de carregar e reproduzir busca e reconstrução do índice gravado
+        try:
+            rss, loaded, vectors = resident_memory(path, mmap, prepared, k)
+        except Exception as e:
+            loads[mmap] = (None, f"{type(e).__name__}: {e}")
+            continue
+        same = np.array_equal(loaded, found) and np.allclose(vectors, expected)
+        loads[mmap] = (rss, "ok" if same else "resultados diferentes")
+    heap, mapped = loads[False][0] or {}, loads[True][0] or {}
+    return {
+        "backend": name,
+        "params": params,
+        "vectors": len(corpus),
+        "build_s": build_seconds,
+        "disk_mb": os.path.getsize(path) / 1e6,
+        "heap_load": loads[False][1],
+        "mmap_load": loads[True][1],
+        "heap_rss_anon_mb": heap.get("RssAnon", float("nan")) / 1e3,
+        "mmap_rss_anon_mb": mapped.get("RssAnon", float("nan")) / 1e3,
+        "mmap_rss_file_mb": mapped.get("RssFile", float("nan")) / 1e3,
+        "top1_agreement": float(np.mean(found[:, 0] == truth[:, 0])),
+        f"recall@{k}": float(np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)])),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index", default=INDEX_PATH, help="FAQ index to read the vectors from")
+    parser.add_argument("--backends", default=",".join(index_backends.DEFAULT_PARAMS),
+                        help="default: every backend")
+    parser.add_argument("--replicate", type=int, default=0, help="jittered copies added to the corpus")
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--noise", type=float, default=0.3, help="query noise, relative to the vector scale")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    corpus, queries = corpus_and_queries(faq_vectors(args.index), args.replicate, args.queries, args.noise)
+    k = min(args.k, len(corpus))
+    exact = faiss.IndexFlatL2(corpus.shape[1])
+    exact.add(corpus)
+    _, truth = exact.search(queries, k)
+
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for name in args.backends.split(","):
+            result = bench_variant(name, corpus, queries, truth, k, work_dir)
+            results.append(result)
+            print(f"{name:>9}: disco={result['disk_mb']:.2f}MB heap={result['heap_rss_anon_mb']:.2f}MB "
+                  f"mmap(anon={result['mmap_rss_anon_mb']:.2f}MB file={result['mmap_rss_file_mb']:.2f}MB) "
+                  f"top1={result['top1_agreement']:.3f} recall@{k}={result[f'recall@{k}']:.3f} "
+                  f"leitura heap={result['heap_load']} mmap={result['mmap_load']}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1)
+    failed = [r["backend"] for r in results if r["heap_load"] != "ok" or r["mmap_load"] != "ok"]
+    if failed:
+        sys.exit(f"Leitura do índice falhou ou divergiu para: {', '.join(failed)}")
+
+
+if __name__ == "__main__":
+    main()
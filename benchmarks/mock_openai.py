@@ -0,0 +1,305 @@
+"""Local OpenAI-compatible mock server for load tests.
+
+    python -m benchmarks.mock_openai --port 8000 --ttft-ms 300 --token-ms 20
+    OPENAI_BASE_URL=http://127.0.0.1:8000/v1 OPENAI_API_KEY=mock streamlit run Home.py
+
+Serves `/v1/chat/completions` (plain, streamed and structured-output calls)
+and `/v1/embeddings` with configurable latency, and counts requests and the
+TCP connections they arrived on (`GET /stats`), so connection reuse is
+visible from the outside. With `--rpm`/`--tpm` it enforces per-model rate
+limits like the real API: over-budget requests get a 429 with
+`retry-after-ms`, and tokens are estimated as characters / 4 plus
+`max_tokens`. `--error-rate` answers that fraction of requests with a 429
+regardless of budget.
+
+Embeddings are bags of hashed words, so paraphrases land near each other
+and retrieval behaves roughly as with a real model. Prompt caching is
+emulated: a prompt that repeats a prefix seen before reports it as
+`cached_tokens`, in 128-token blocks from 1024 tokens up, like the API.
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import multiprocessing
+import re
+import threading
+import time
+
+import numpy as np
+from aiohttp import web
+
+from ibelt.scheduler import TokenBucket
+
+RESPOSTA = ("A Lei do Bem permite deduzir gastos com pesquisa, desenvolvimento e inovação tecnológica "
+            "do lucro real, reduzindo o IRPJ e a CSLL devidos pela empresa.")
+
+# Cache de prompt da API: prefixos a partir de 1024 tokens, em blocos de 128
+PROMPT_CACHE_MIN_TOKENS = 1024
+PROMPT_CACHE_BLOCK_TOKENS = 128
+
+
+class MockOpenAI:
+    """aiohttp application emulating the chat and embeddings endpoints.
+
+    Args:
+        ttft_ms (float): delay before the first token (or the whole reply)
+        token_ms (float): delay between streamed tokens
+        embedding_ms (float): delay per embeddings request
+        dimension (int): embedding dimension
+        rpm (int): requests per minute allowed per model (None = unlimited)
+        tpm (int): tokens per minute allowed per model (None = unlimited)
+        error_rate (float): fraction of requests answered with a 429 at random
+        seed (int): seed of the random 429s
+    """
+
+    def __init__(self, ttft_ms=200.0, token_ms=10.0, embedding_ms=30.0, dimension=1536, rpm=None, tpm=None,
+                 error_rate=0.0, seed=0):
+        self.ttft_ms = ttft_ms
+        self.token_ms = token_ms
+        self.embedding_ms = embedding_ms
+        self.dimension = dimension
+        self.rpm = rpm
+        self.tpm = tpm
+        self.error_rate = error_rate
+        self.requests = 0
+        self.rate_limited = 0
+        self.injected_errors = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.by_path = {}
+        self._buckets = {}
+        self._prefixes = set()
+        self._word_vectors = {}
+        self._rng = np.random.default_rng(seed)
+        self._connections = set()
+        self.app = web.Application(middlewares=[self._count])
+        self.app.add_routes([
+            web.post("/v1/chat/completions", self.chat),
+            web.post("/v1/embeddings", self.embeddings),
+            web.get("/stats", self.stats),
+        ])
+
+    @web.middleware
+    async def _count(self, request, handler):
+        self.requests += 1
+        # Porta de origem identifica a conexão TCP (reaproveitada com keep-alive)
+        self._connections.add(request.transport.get_extra_info("peername"))
+        self.by_path[request.path] = self.by_path.get(request.path, 0) + 1
+        return await handler(request)
+
+    def stats_dict(self):
+        return {"requests": self.requests, "connections": len(self._connections),
+                "rate_limited": self.rate_limited, "injected_errors": self.injected_errors,
+                "prompt_tokens": self.prompt_tokens, "cached_tokens": self.cached_tokens,
+                "by_path": dict(self.by_path)}
+
+    @staticmethod
+    def _estimate_tokens(body):
+        if "input" in body:
+            texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        else:
+            texts = [m["content"] for m in body.get("messages", []) if isinstance(m.get("content"), str)]
+        return sum(len(text) for text in texts) // 4 + (body.get("max_tokens") or 0)
+
+    @staticmethod
+    def _rate_limit_response(model, kind, wait):
+        return web.json_response(
+            {"error": {"message": f"Rate limit reached for {model} on {kind}.", "type": kind,
+                       "param": None, "code": "rate_limit_exceeded"}},
+            status=429, headers={"retry-after-ms": str(int(wait * 1e3) + 1)})
+
+    def _over_limit(self, body):
+        """Returns a 429 response if `body` exceeds its model's budget (or draws an
+        injected error), else None."""
+        model = body.get("model")
+        if self.error_rate and self._rng.random() < self.error_rate:
+            self.injected_errors += 1
+            return self._rate_limit_response(model, "requests", 0.05)
+        if self.rpm is None and self.tpm is None:
+            return None
+        if model not in self._buckets:
+            self._buckets[model] = (TokenBucket(self.rpm), TokenBucket(self.tpm))
+        requests, tokens = self._buckets[model]
+        cost = self._estimate_tokens(body)
+        now = time.monotonic()
+        wait = max(requests.wait_time(1, now), tokens.wait_time(cost, now))
+        if wait > 0:
+            self.rate_limited += 1
+            kind = "requests" if requests.wait_time(1, now) > 0 else "tokens"
+            return self._rate_limit_response(model, kind, wait)
+        requests.take(1)
+        tokens.take(cost)
+        return None
+
+    async def stats(self, request):
+        return web.json_response(self.stats_dict())
+
+    @staticmethod
+    def _reply_text(body):
+        if body.get("response_format", {}).get("type") == "json_schema":
+            # Saída estruturada: um objeto vazio é válido para esquemas só com campos opcionais
+            return "{}"
+        return RESPOSTA
+
+    def _cached_prefix(self, body, prompt_tokens):
+        """Tokens of the longest block-aligned prompt prefix seen before; remembers this prompt's."""
+        prompt = json.dumps([body.get("model"), body.get("messages", [])], ensure_ascii=False)
+        cached = 0
+        for tokens in range(PROMPT_CACHE_MIN_TOKENS, prompt_tokens + 1, PROMPT_CACHE_BLOCK_TOKENS):
+            # ~4 caracteres por token, como em `_estimate_tokens`
+            prefix = hashlib.blake2b(prompt[:tokens * 4].encode("utf-8"), digest_size=16).digest()
+            if prefix in self._prefixes:
+                cached = tokens
+            else:
+                self._prefixes.add(prefix)
+        return cached
+
+    def _usage(self, body, content):
+        prompt_tokens = self._estimate_tokens({**body, "max_tokens": 0})
+        completion_tokens = len(content.split())
+        cached_tokens = self._cached_prefix(body, prompt_tokens)
+        self.prompt_tokens += prompt_tokens
+        self.cached_tokens += cached_tokens
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "prompt_tokens_details": {"cached_tokens": cached_tokens}}
+
+    def _completion(self, body, content, usage):
+        return {
+            "id": "chatcmpl-mock", "object": "chat.completion", "created": int(time.time()),
+            "model": body["model"],
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": usage,
+        }
+
+    async def chat(self, request):
+        body = await request.json()
+        if (limited := self._over_limit(body)) is not None:
+            return limited
+        content = self._reply_text(body)
+        # Conta o uso ao receber: o cache de prompt vale a partir daqui, mesmo se o cliente desistir
+        usage = self._usage(body, content)
+        await asyncio.sleep(self.ttft_ms / 1e3)
+        if not body.get("stream"):
+            return web.json_response(self._completion(body, content, usage))
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for i, token in enumerate(content.split(" ")):
+            if i:
+                await asyncio.sleep(self.token_ms / 1e3)
+            chunk = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": int(time.time()),
+                     "model": body["model"],
+                     "choices": [{"index": 0, "delta": {"content": (" " if i else "") + token},
+                                  "finish_reason": None}]}
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        if body.get("stream_options", {}).get("include_usage"):
+            chunk = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": int(time.time()),
+                     "model": body["model"], "choices": [], "usage": usage}
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def embeddings(self, request):
+        body = await request.json()
+        if (limited := self._over_limit(body)) is not None:
+            return limited
+        texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        await asyncio.sleep(self.embedding_ms / 1e3)
+        data = []
+        for i, text in enumerate(texts):
+            vector = self._embed(text)
+            # O SDK pede base64 por padrão quando o numpy está instalado
+            embedding = (base64.b64encode(vector.tobytes()).decode()
+                         if body.get("encoding_format") == "base64" else vector.tolist())
+            data.append({"object": "embedding", "index": i, "embedding": embedding})
+        tokens = self._estimate_tokens(body)
+        return web.json_response({"object": "list", "data": data, "model": body["model"],
+                                  "usage": {"prompt_tokens": tokens, "total_tokens": tokens}})
+
+    def _word_vector(self, word):
+        vector = self._word_vectors.get(word)
+        if vector is None:
+            seed = int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+            vector = np.random.default_rng(seed).standard_normal(self.dimension).astype("float32")
+            self._word_vectors[word] = vector
+        return vector
+
+    def _embed(self, text):
+        # Soma dos vetores das palavras: textos com palavras em comum ficam próximos
+        words = re.findall(r"\w+", text.lower()) or [text]
+        vector = np.sum([self._word_vector(word) for word in words], axis=0)
+        return vector / np.linalg.norm(vector)
+
+
+def start_in_thread(mock, host="127.0.0.1", port=0):
+    """Serves `mock` from a daemon thread; returns the base URL (ending in /v1)."""
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+    sockets = []
+
+    async def serve():
+        runner = web.AppRunner(mock.app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, host, port, backlog=1024)
+        await site.start()
+        sockets.extend(site._server.sockets)
+        ready.set()
+
+    def run():
+        loop.run_until_complete(serve())
+        loop.run_forever()
+
+    threading.Thread(target=run, name="mock-openai", daemon=True).start()
+    ready.wait()
+    return f"http://{host}:{sockets[0].getsockname()[1]}/v1"
+
+
+def _serve_process(connection, kwargs):
+    connection.send(start_in_thread(MockOpenAI(**kwargs)))
+    threading.Event().wait()
+
+
+def start_in_process(**kwargs):
+    """Serves a `MockOpenAI(**kwargs)` from a separate process, so it does not
+    compete with the client under test for the GIL.
+
+    Returns:
+        tuple: (base URL ending in /v1, process); read counters from `<url>/../stats`
+    """
+    parent, child = multiprocessing.Pipe()
+    process = multiprocessing.get_context("spawn").Process(
+        target=_serve_process, args=(child, kwargs), daemon=True)
+    process.start()
+    return parent.recv(), process
+
+
+def fetch_stats(base_url):
+    import httpx
+
+    return httpx.get(base_url.removesuffix("/v1") + "/stats").json()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--ttft-ms", type=float, default=200.0)
+    parser.add_argument("--token-ms", type=float, default=10.0)
+    parser.add_argument("--embedding-ms", type=float, default=30.0)
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--rpm", type=int, default=None, help="requests per minute per model")
+    parser.add_argument("--tpm", type=int, default=None, help="tokens per minute per model")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with a 429")
+    args = parser.parse_args()
+    mock = MockOpenAI(args.ttft_ms, args.token_ms, args.embedding_ms, args.dimension, args.rpm, args.tpm,
+                      args.error_rate)
+    web.run_app(mock.app, host=args.host, port=args.port, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
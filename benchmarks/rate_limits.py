@@ -0,0 +1,112 @@
+"""Traffic burst against a rate-limited mock: client-side scheduling vs retrying on 429.
+
+    python -m benchmarks.rate_limits
+    python -m benchmarks.rate_limits --rpm 120 --interactive 80 --background 80 --json results.json
+
+The mock enforces `--rpm`/`--tpm` per model. A burst of background lead
+extractions is queued first, then interactive replies on the same model,
+plus embedding requests where many sessions ask for the same few texts at
+once. `scheduled` gives the gateway the same limits as the server, so it
+queues locally by priority; `unscheduled` has no local limits and relies on
+429 + backoff. Reported per mode: 429s seen by the server, failed calls,
+completion latency per priority and upstream embedding calls.
+"""
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from benchmarks.mock_openai import fetch_stats, start_in_process
+from ibelt.gateway import LLMGateway, SyncClient
+from ibelt.scheduler import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE
+
+CHAT_MODEL = "gpt-4o-mini"
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+
+def timed(call):
+    start = time.perf_counter()
+    try:
+        call()
+        return time.perf_counter() - start, None
+    except Exception as e:
+        return time.perf_counter() - start, type(e).__name__
+
+
+def bench_mode(mode, base_url, args):
+    limits = {CHAT_MODEL: (args.rpm, args.tpm), EMBEDDING_MODEL: (args.rpm, args.tpm)} if mode == "scheduled" else {}
+    gateway = LLMGateway(api_key="mock", base_url=base_url, limits=limits, max_retries=args.max_retries)
+    client = SyncClient(lambda: gateway)
+
+    def chat(priority):
+        return lambda: client.chat.completions.create(
+            model=CHAT_MODEL, messages=[{"role": "user", "content": "Qual o regime tributário da sua empresa?"}],
+            max_tokens=200, priority=priority)
+
+    def embed(i):
+        return lambda: client.embeddings.create(model=EMBEDDING_MODEL, input=[f"pergunta frequente {i % args.unique_texts}"])
+
+    calls = ([("background", chat(PRIORITY_BACKGROUND))] * args.background
+             + [("interactive", chat(PRIORITY_INTERACTIVE))] * args.interactive
+             + [("embedding", embed(i)) for i in range(args.embeddings)])
+    before = fetch_stats(base_url)
+    with ThreadPoolExecutor(max_workers=len(calls)) as pool:
+        futures = []
+        for kind, call in calls:
+            futures.append((kind, pool.submit(timed, call)))
+            # Mantém a ordem de chegada: os pedidos de segundo plano entram primeiro
+            time.sleep(0.001)
+        outcomes = [(kind, future.result()) for kind, future in futures]
+    after = fetch_stats(base_url)
+    stats = gateway.stats()
+    gateway.close()
+
+    result = {"mode": mode, "server_429": after["rate_limited"] - before["rate_limited"],
+              "failed": sum(1 for _, (_, error) in outcomes if error),
+              "embedding_requests": args.embeddings,
+              "embedding_upstream_calls": (after["by_path"].get("/v1/embeddings", 0)
+                                           - before["by_path"].get("/v1/embeddings", 0)),
+              "coalesced": stats["coalesced"]}
+    for kind in ("interactive", "background"):
+        latencies = np.array([seconds for k, (seconds, error) in outcomes if k == kind and not error])
+        if len(latencies):
+            result[f"{kind}_p50_s"] = float(np.percentile(latencies, 50))
+            result[f"{kind}_p99_s"] = float(np.percentile(latencies, 99))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rpm", type=int, default=60)
+    parser.add_argument("--tpm", type=int, default=None)
+    parser.add_argument("--interactive", type=int, default=40)
+    parser.add_argument("--background", type=int, default=40)
+    parser.add_argument("--embeddings", type=int, default=60)
+    parser.add_argument("--unique-texts", type=int, default=5)
+    parser.add_argument("--max-retries", type=int, default=4)
+    parser.add_argument("--modes", default="scheduled,unscheduled")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    results = []
+    for mode in args.modes.split(","):
+        # Servidor novo por modo: cada um começa com o balde cheio
+        base_url, server = start_in_process(ttft_ms=100.0, embedding_ms=50.0, rpm=args.rpm, tpm=args.tpm)
+        result = bench_mode(mode, base_url, args)
+        server.terminate()
+        results.append(result)
+        print(f"{mode:>11}: 429={result['server_429']} falhas={result['failed']} "
+              f"interativas p50={result.get('interactive_p50_s', float('nan')):.1f}s "
+              f"p99={result.get('interactive_p99_s', float('nan')):.1f}s "
+              f"segundo plano p50={result.get('background_p50_s', float('nan')):.1f}s "
+              f"p99={result.get('background_p99_s', float('nan')):.1f}s "
+              f"embeddings {result['embedding_upstream_calls']}/{result['embedding_requests']} chamadas")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""Replays recorded conversations through both chatbots against the mock LLM.
+
+    python -m benchmarks.replay
+    python -m benchmarks.replay --concurrency 64 --repeat 3 --json results.json
+    python -m benchmarks.replay --error-rate 0.05 --json new.json --baseline old.json
+    python -m benchmarks.replay --record .cache/sessions.sqlite --corpus recorded.jsonl
+
+Each corpus line is a conversation, `{"id", "bot", "turns": [user messages]}`;
+the default corpus (benchmarks/corpus/) holds the FAQ questions, paraphrases
+and follow-ups for the Consultor and lead-qualification dialogues for the
+Agente Comercial. `--record` builds a corpus from a session store instead,
+from the user messages of real conversations.
+
+Conversations run `--concurrency` at a time, one thread each (as Streamlit
+sessions do), through `ConversationPool` with an in-memory store, the
+process-wide LLM gateway and the mock server (`benchmarks.mock_openai`) in
+another process; indexes and caches start empty in a temporary directory,
+so `--repeat` shows the warm-cache steady state. Reported per bot: turns
+per second, time to first fragment and full reply latency (p50/p95/p99),
+tokens per turn from the turn traces, and the hit rates of the query
+embedding cache, the answer cache, the lexical fast path and the emulated
+prompt cache. `--json` writes them with the git revision, to compare runs
+with `--baseline`.
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from benchmarks.mock_openai import fetch_stats, start_in_process
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CORPUS = os.path.join(REPO_DIR, "benchmarks", "corpus", "conversations.jsonl")
+
+# Métricas comparadas com `--baseline` (menor é melhor, exceto as taxas e o throughput)
+COMPARED = ["turns_per_s", "ttft_p50_ms", "ttft_p95_ms", "ttft_p99_ms", "reply_p50_ms", "reply_p99_ms",
+            "input_tokens_per_turn", "output_tokens_per_turn", "prompt_cache_hit_rate"]
+
+
+def load_corpus(path, bots=None):
+    with open(path, encoding="utf-8") as f:
+        conversations = [json.loads(line) for line in f if line.strip()]
+    return [c for c in conversations if bots is None or c["bot"] in bots]
+
+
+def record_corpus(db_path, out_path):
+    """Writes the user messages of every conversation in a session store as a corpus."""
+    # Só leitura: o banco pode estar em uso pelos workers
+    db = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    rows = db.execute("SELECT conversation_id, content FROM turns WHERE role = 'user' "
+                      "ORDER BY conversation_id, seq").fetchall()
+    db.close()
+    conversations = {}
+    for conversation_id, content in rows:
+        conversations.setdefault(conversation_id, []).append(content)
+    with open(out_path, "w", encoding="utf-8") as f:
+        for conversation_id, turns in conversations.items():
+            # IDs do store são "<bot>/<conversa>", veja `ConversationPool.key`
+            bot, _, _ = conversation_id.partition("/")
+            f.write(json.dumps({"id": conversation_id, "bot": bot, "turns": turns}, ensure_ascii=False) + "\n")
+    return len(conversations)
+
+
+def replay_conversation(pool, conversation, name):
+    turns = []
+    for message in conversation["turns"]:
+        reply = pool.reply(conversation["bot"], name, message)
+        start = time.perf_counter()
+        first = None
+        partes = []
+        for parte in reply:
+            if first is None:
+                first = time.perf_counter() - start
+            partes.append(parte)
+        turns.append({"bot": conversation["bot"], "ttft": first if first is not None else np.nan,
+                      "total": time.perf_counter() - start, "trace": reply.trace,
+                      "error": "".join(partes).startswith("Erro ao obter resposta")})
+    return turns
+
+
+def summarize(turns, elapsed):
+    ttft = np.array([t["ttft"] for t in turns])
+    total = np.array([t["total"] for t in turns])
+    tokens = {"input_tokens": 0, "cached_input_tokens": 0, "output_tokens": 0}
+    counts = {"llm_calls": 0, "embedding_lookups": 0, "embedding_hits": 0, "exact_lookups": 0, "exact_hits": 0}
+    for turn in turns:
+        for span in turn["trace"].spans:
+            for key in tokens:
+                tokens[key] += span.attributes.get(f"gen_ai.usage.{key}", 0)
+            if span.name == "llm.chat":
+                counts["llm_calls"] += 1
+            elif span.name == "embedding.query":
+                counts["embedding_lookups"] += 1
+                counts["embedding_hits"] += bool(span.attributes.get("cache_hit"))
+            elif span.name == "bm25.exact_match":
+                counts["exact_lookups"] += 1
+                counts["exact_hits"] += bool(span.attributes.get("hit"))
+    n = len(turns)
+    return {
+        "turns": n,
+        "turns_per_s": n / elapsed,
+        "errors": sum(t["error"] for t in turns),
+        "ttft_p50_ms": float(np.nanpercentile(ttft, 50) * 1e3),
+        "ttft_p95_ms": float(np.nanpercentile(ttft, 95) * 1e3),
+        "ttft_p99_ms": float(np.nanpercentile(ttft, 99) * 1e3),
+        "reply_p50_ms": float(np.percentile(total, 50) * 1e3),
+        "reply_p95_ms": float(np.percentile(total, 95) * 1e3),
+        "reply_p99_ms": float(np.percentile(total, 99) * 1e3),
+        "llm_calls_per_turn": counts["llm_calls"] / n,
+        "input_tokens_per_turn": tokens["input_tokens"] / n,
+        "cached_input_tokens_per_turn": tokens["cached_input_tokens"] / n,
+        "output_tokens_per_turn": tokens["output_tokens"] / n,
+        "prompt_cache_hit_rate": tokens["cached_input_tokens"] / tokens["input_tokens"] if tokens["input_tokens"] else 0.0,
+        "embedding_cache_hit_rate": (counts["embedding_hits"] / counts["embedding_lookups"]
+                                     if counts["embedding_lookups"] else 0.0),
+        "exact_match_rate": counts["exact_hits"] / counts["exact_lookups"] if counts["exact_lookups"] else 0.0,
+    }
+
+
+def run_replay(corpus, concurrency, repeat):
+    # Importados só aqui: o diretório do cache e o caminho do índice dependem do ambiente montado em `main`
+    from ibelt.answer_cache import get_answer_cache
+    from ibelt.bots import ConversationPool
+    from ibelt.embeddings import get_embedder
+    from ibelt.faq import FAQ_DATA
+    from ibelt.retriever import get_retriever
+    from ibelt.sessions import MemorySessionStore
+
+    embedder = get_embedder()
+    # Monta o índice do FAQ antes de medir: é custo de implantação, não de turno
+    get_retriever(FAQ_DATA, embedder.embed, embedder.model)
+    pool = ConversationPool(MemorySessionStore())
+    jobs = [(conversation, f"replay{round_}-{i}")
+            for round_ in range(repeat) for i, conversation in enumerate(corpus)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda job: replay_conversation(pool, *job), jobs))
+    elapsed = time.perf_counter() - start
+    turns = [turn for conversation in results for turn in conversation]
+
+    summary = {"all": summarize(turns, elapsed)}
+    for bot in sorted({t["bot"] for t in turns}):
+        summary[bot] = summarize([t for t in turns if t["bot"] == bot], elapsed)
+    answer_cache = get_answer_cache(embedder.model, embedder.dimension).stats()
+    summary["caches"] = {"query_embeddings": embedder.cache.stats(), "answers": answer_cache}
+    return summary
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_summary(result, baseline=None):
+    for name, summary in result["bots"].items():
+        print(f"{name:>16}: {summary['turns']} turnos, {summary['turns_per_s']:.1f}/s "
+              f"ttft p50={summary['ttft_p50_ms']:.0f}ms p95={summary['ttft_p95_ms']:.0f}ms "
+              f"p99={summary['ttft_p99_ms']:.0f}ms resposta p50={summary['reply_p50_ms']:.0f}ms "
+              f"p99={summary['reply_p99_ms']:.0f}ms tokens/turno={summary['input_tokens_per_turn']:.0f}"
+              f"+{summary['output_tokens_per_turn']:.0f} cache de prompt={summary['prompt_cache_hit_rate']:.0%} "
+              f"erros={summary['errors']}")
+    caches = result["caches"]
+    print(f"{'caches':>16}: embeddings={caches['query_embeddings']['hit_rate']:.0%} "
+          f"respostas={caches['answers']['hit_rate']:.0%} "
+          f"atalho léxico={result['bots']['all']['exact_match_rate']:.0%} "
+          f"429={result['mock']['rate_limited'] + result['mock']['injected_errors']}")
+    if baseline is None:
+        return
+    print(f"comparado com {baseline.get('git_revision') or 'baseline'}:")
+    for name, summary in result["bots"].items():
+        old = baseline["bots"].get(name)
+        if old is None:
+            continue
+        deltas = [f"{key}={(summary[key] - old[key]) / old[key]:+.0%}" for key in COMPARED if old.get(key)]
+        print(f"{name:>16}: " + " ".join(deltas))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--record", metavar="SESSIONS_DB", help="write --corpus from a session store and exit")
+    parser.add_argument("--bots", default="consultor,agente_comercial")
+    parser.add_argument("--concurrency", type=int, default=32, help="conversations running at once")
+    parser.add_argument("--repeat", type=int, default=1, help="times the corpus is replayed")
+    parser.add_argument("--embedder", default="openai", choices=["openai", "fake"],
+                        help="openai = embeddings endpoint of the mock")
+    parser.add_argument("--ttft-ms", type=float, default=200.0)
+    parser.add_argument("--token-ms", type=float, default=10.0)
+    parser.add_argument("--embedding-ms", type=float, default=30.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of mock requests answered with 429")
+    parser.add_argument("--rpm", type=int, default=None, help="mock requests per minute per model")
+    parser.add_argument("--tpm", type=int, default=None, help="mock tokens per minute per model")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="results file of an earlier run to compare with")
+    args = parser.parse_args()
+
+    if args.record:
+        count = record_corpus(args.record, args.corpus)
+        print(f"{count} conversas gravadas em {args.corpus}")
+        return
+    corpus = load_corpus(args.corpus, set(args.bots.split(",")))
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    if args.json:
+        args.json = os.path.abspath(args.json)
+
+    base_url, mock = start_in_process(ttft_ms=args.ttft_ms, token_ms=args.token_ms,
+                                      embedding_ms=args.embedding_ms, error_rate=args.error_rate,
+                                      rpm=args.rpm, tpm=args.tpm)
+    with tempfile.TemporaryDirectory() as work_dir:
+        os.environ.update(OPENAI_BASE_URL=base_url, OPENAI_API_KEY="mock", IBELT_EMBEDDER=args.embedder,
+                          IBELT_CACHE_DIR=os.path.join(work_dir, ".cache"))
+        # Índices do FAQ e caches são gravados no diretório de trabalho; começam vazios
+        cwd = os.getcwd()
+        os.chdir(work_dir)
+        try:
+            summary = run_replay(corpus, args.concurrency, args.repeat)
+        finally:
+            os.chdir(cwd)
+    mock_stats = fetch_stats(base_url)
+    mock.terminate()
+
+    caches = summary.pop("caches")
+    result = {
+        "git_revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "parameters": {key: value for key, value in vars(args).items() if key not in ("json", "baseline", "record")},
+        "conversations": len(corpus) * args.repeat,
+        "bots": summary,
+        "caches": caches,
+        "mock": {key: value for key, value in mock_stats.items() if key != "by_path"},
+    }
+    print_summary(result, baseline)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
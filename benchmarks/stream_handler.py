@@ -0,0 +1,74 @@
+"""Compares render counts and CPU time of StreamHandler against the unbuffered handler.
+
+    python -m benchmarks.stream_handler --tokens 2000 --sessions 8
+"""
+import argparse
+import time
+
+from streaming import StreamHandler
+
+
+class LegacyStreamHandler:
+    """The previous handler: string concatenation and one render per token."""
+
+    def __init__(self, container, initial_text=""):
+        self.container = container
+        self.text = initial_text
+
+    def on_llm_new_token(self, token, **kwargs):
+        self.text += token
+        self.container.markdown(self.text)
+
+    def flush(self):
+        pass
+
+
+class FakeContainer:
+    """Stands in for `st.empty()`; serialising the text approximates a render."""
+
+    def __init__(self):
+        self.renders = 0
+        self.rendered_bytes = 0
+
+    def markdown(self, text):
+        self.renders += 1
+        self.rendered_bytes += len(text.encode("utf-8"))
+
+
+def run(handler_cls, tokens, sessions, token_delay):
+    containers = [FakeContainer() for _ in range(sessions)]
+    handlers = [handler_cls(container) for container in containers]
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    for token in tokens:
+        for handler in handlers:
+            handler.on_llm_new_token(token)
+        if token_delay:
+            time.sleep(token_delay)
+    for handler in handlers:
+        handler.flush()
+    return {
+        "renders": sum(c.renders for c in containers),
+        "rendered_mb": sum(c.rendered_bytes for c in containers) / 1e6,
+        "cpu_s": time.process_time() - cpu_start,
+        "wall_s": time.perf_counter() - wall_start,
+        "complete": all(h.text == "".join(tokens) for h in handlers),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tokens", type=int, default=2000)
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--token-delay", type=float, default=0.0,
+                        help="seconds between tokens, to mimic model speed")
+    args = parser.parse_args()
+
+    tokens = [f"palavra{i % 50} " for i in range(args.tokens)]
+    for name, handler_cls in [("legacy", LegacyStreamHandler), ("buffered", StreamHandler)]:
+        result = run(handler_cls, tokens, args.sessions, args.token_delay)
+        print(f"{name:>8}: renders={result['renders']:>7} rendered={result['rendered_mb']:>9.1f} MB "
+              f"cpu={result['cpu_s']:.3f}s wall={result['wall_s']:.3f}s complete={result['complete']}")
+
+
+if __name__ == "__main__":
+    main()
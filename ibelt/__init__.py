@@ -0,0 +1 @@
+"""Shared building blocks for the PierX chatbots (retrieval, indexes, LLM clients)."""
@@ -0,0 +1,63 @@
+"""Offline build steps, bulk answering and the chatbot API.
+
+    python -m ibelt ingest tmp/
+    python -m ibelt answer tickets.csv --output respostas.jsonl
+    python -m ibelt serve --port 8080
+"""
+import argparse
+
+from dotenv import load_dotenv
+
+from ibelt import documents
+from ibelt.batch import BatchAnswerer, iter_questions
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m ibelt", description=__doc__)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ingest = commands.add_parser("ingest", help="index PDF documents for the Consultor")
+    ingest.add_argument("paths", nargs="+", help="PDF files or directories")
+    ingest.add_argument("--index", default=None,
+                        help=f"default: {documents.DOCUMENTS_INDEX_PATH}, suffixed for non-default embedding models")
+    ingest.add_argument("--workers", type=int, default=None)
+    ingest.add_argument("--batch-size", type=int, default=128)
+
+    answer = commands.add_parser("answer", help="answer a CSV/JSONL file of questions with the Consultor")
+    answer.add_argument("input", help="CSV with a header row, or .jsonl")
+    answer.add_argument("--output", required=True, help="JSONL of answers; an existing file is resumed")
+    answer.add_argument("--question-field", default="question")
+    answer.add_argument("--id-field", default="id", help="rows without it are numbered by position")
+    answer.add_argument("--model", default="gpt-4o")
+    answer.add_argument("--concurrency", type=int, default=32, help="model calls in flight")
+    answer.add_argument("--batch-size", type=int, default=512, help="questions embedded and searched together")
+
+    serve = commands.add_parser("serve", help="serve the chatbots over HTTP (see ibelt.server)")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8080)
+    serve.add_argument("--workers", type=int, default=1, help="worker processes sharing the SQLite session store")
+
+    args = parser.parse_args()
+    load_dotenv()
+    if args.command == "ingest":
+        documents.ingest(args.paths, index_path=args.index, workers=args.workers,
+                         batch_size=args.batch_size)
+    elif args.command == "answer":
+        answerer = BatchAnswerer(model=args.model, concurrency=args.concurrency, batch_size=args.batch_size)
+        counts = answerer.run(iter_questions(args.input, args.question_field, args.id_field), args.output)
+        answered = counts["modelo"] + counts["cache"] + counts["sem_contexto"]
+        covered = counts["modelo"] + counts["cache"]
+        print(f"{answered} respondidas em {counts['seconds']:.1f}s ({answered / max(counts['seconds'], 1e-9):.1f}/s): "
+              f"{counts['modelo']} pelo modelo, {counts['cache']} do cache, {counts['sem_contexto']} sem contexto "
+              f"(cobertura {covered / answered if answered else 0.0:.0%}); "
+              f"{counts['skipped']} já respondidas, {counts['errors']} com erro")
+    elif args.command == "serve":
+        try:
+            import uvicorn
+        except ImportError as e:
+            raise SystemExit("O serviço requer um servidor ASGI: `pip install uvicorn`") from e
+        uvicorn.run("ibelt.server:app", host=args.host, port=args.port, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import os
+import threading
+import time
+
+import faiss
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """Caches chat answers by question embedding for near-duplicate questions.
+
+    Past questions live in an inner-product FAISS index over unit vectors, so
+    scores are cosine similarities. A cached answer is returned only when the
+    similarity reaches `threshold` and it was produced from the same
+    retrieved FAQ entry. Entries expire after `ttl_seconds` and the oldest are
+    evicted past `max_entries`.
+    """
+
+    def __init__(self, dimension, threshold=0.95, ttl_seconds=3600, max_entries=5000, k=4):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.k = k
+        self._index = faiss.IndexIDMap(faiss.IndexFlatIP(dimension))
+        self._entries = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _unit(embedding):
+        vector = np.asarray(embedding, dtype="float32").reshape(1, -1).copy()
+        faiss.normalize_L2(vector)
+        return vector
+
+    def _remove(self, ids):
+        if ids:
+            self._index.remove_ids(np.array(ids, dtype="int64"))
+            for entry_id in ids:
+                del self._entries[entry_id]
+
+    def _expire(self, now):
+        # Entradas são inseridas em ordem cronológica, então as mais antigas vêm primeiro
+        expired = []
+        for entry_id, (_, _, created_at) in self._entries.items():
+            if now - created_at < self.ttl_seconds:
+                break
+            expired.append(entry_id)
+        self._remove(expired)
+
+    def lookup(self, embedding, entry):
+        """Returns the cached answer for a similar question about the same FAQ entry.
+
+        Args:
+            embedding (list | np.ndarray): question embedding
+            entry (hashable): identifies the retrieved FAQ content
+
+        Returns:
+            str | None: cached answer, or None on a miss
+        """
+        with self._lock:
+            self._expire(time.time())
+            if self._index.ntotal:
+                scores, ids = self._index.search(self._unit(embedding), self.k)
+                for score, entry_id in zip(scores[0], ids[0]):
+                    if entry_id < 0 or score < self.threshold:
+                        break
+                    cached_entry, answer, _ = self._entries[int(entry_id)]
+                    if cached_entry == entry:
+                        self.hits += 1
+                        return answer
+            self.misses += 1
+            return None
+
+    def store(self, embedding, entry, answer):
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._index.add_with_ids(self._unit(embedding), np.array([entry_id], dtype="int64"))
+            self._entries[entry_id] = (entry, answer, time.time())
+            excess = len(self._entries) - self.max_entries
+            if excess > 0:
+                self._remove(list(self._entries)[:excess])
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+        }
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_answer_cache(model, dimension):
+    """Returns the process-wide answer cache for an embedding model.
+
+    `IBELT_ANSWER_CACHE_THRESHOLD` sets the cosine similarity a new question
+    needs to reuse a cached answer (default 0.95): lower raises the hit
+    rate, at the risk of answering a different question.
+    """
+    with _caches_lock:
+        if model not in _caches:
+            threshold = os.environ.get("IBELT_ANSWER_CACHE_THRESHOLD")
+            _caches[model] = SemanticAnswerCache(dimension, threshold=float(threshold) if threshold else 0.95)
+        return _caches[model]
@@ -0,0 +1,197 @@
+import csv
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+
+from ibelt import llm, prompts, tracing
+from ibelt.answer_cache import get_answer_cache
+from ibelt.bots import CustomDataChatbot
+from ibelt.documents import get_document_index
+from ibelt.embeddings import get_embedder
+from ibelt.faq import FAQ_DATA
+from ibelt.retriever import get_retriever
+
+
+def iter_questions(path, question_field="question", id_field="id"):
+    """Yields (id, question) pairs from a CSV (with a header row) or JSONL file.
+
+    The file is read one row at a time, so inputs of any size stream
+    through. Rows without `id_field` (key absent, null or blank, as in an
+    empty CSV column) are numbered by position from 1, which is stable
+    across runs of the same file; any other value, including 0, is the ID.
+    Rows with an empty question are skipped.
+
+    Args:
+        path (str): ".jsonl" file of objects, or a CSV file
+        question_field (str): column / key holding the question
+        id_field (str): column / key holding the row ID
+    """
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.endswith(".jsonl"):
+            rows = (json.loads(line) for line in f if line.strip())
+        else:
+            rows = csv.DictReader(f)
+        for number, row in enumerate(rows, start=1):
+            question = str(row.get(question_field) or "").strip()
+            if question:
+                row_id = row.get(id_field)
+                row_id = "" if row_id is None else str(row_id).strip()
+                yield row_id or str(number), question
+
+
+def load_checkpoint(output_path):
+    """Returns the IDs already answered in `output_path`.
+
+    The output file is the checkpoint: every answer is one JSON line,
+    appended as soon as it is ready. A last line cut short by a crash is
+    truncated away, so the run resumes from a clean file.
+    """
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, "rb+") as f:
+        valid = 0
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            valid += len(line)
+            try:
+                done.add(json.loads(line)["id"])
+            except (ValueError, KeyError):
+                continue
+        f.truncate(valid)
+    return done
+
+
+class BatchAnswerer:
+    """Answers many Consultor questions with the retrieval and prompt of the chat.
+
+    Questions go through in chunks of `batch_size`. In each chunk, questions
+    that match a FAQ entry term for term skip the embedding; the rest are
+    embedded with one bulk `embed` call (split into large requests by the
+    embedder) and looked up with one matrix `index.search` per index. Model
+    calls then run on `concurrency` threads through the shared gateway,
+    whose rate limiter (`IBELT_LLM_LIMITS`) paces them to the
+    organisation's RPM/TPM budget, and the next chunk is retrieved while
+    they run. Each question is traced as a "batch.answer" turn.
+
+    Args:
+        client: OpenAI-style client (default: the process-wide gateway client)
+        embedder: default: `get_embedder()`
+        faq_data (list): (question, answer) pairs
+        model (str): chat model
+        concurrency (int): model calls in flight at once
+        batch_size (int): questions embedded and searched together
+    """
+
+    def __init__(self, client=None, embedder=None, faq_data=FAQ_DATA, model="gpt-4o", concurrency=32,
+                 batch_size=512):
+        self.client = client or llm.get_client()
+        self.embedder = embedder or get_embedder()
+        self.faq_data = faq_data
+        self.model = model
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+
+    def retrieve(self, questions):
+        """Returns (faq, chunks, embedding) per question, as the chatbot would find them."""
+        bot = CustomDataChatbot
+        retriever = get_retriever(self.faq_data, self.embedder.embed, self.embedder.model)
+        with tracing.turn("batch.retrieve", questions=len(questions)):
+            results = []
+            for question in questions:
+                faq_id = retriever.lexical_match(question)
+                faq = [] if faq_id is None else [(faq_id, retriever.answer(faq_id))]
+                results.append((faq, [], None))
+            pending = [i for i, (faq, _, _) in enumerate(results) if not faq]
+            if not pending:
+                return results
+            with tracing.span("embedding.batch", texts=len(pending)):
+                vectors = self.embedder.embed([questions[i] for i in pending])
+            faq_hits = retriever.search_hybrid_batch(
+                vectors, [questions[i] for i in pending], k=bot.K_FAQ, max_distance=bot.DISTANCIA_MAXIMA,
+                mmr_lambda=bot.MMR_LAMBDA, min_lexical_score=bot.BM25_MINIMO)
+            documentos = get_document_index(self.embedder.model)
+            trechos = (documentos.search_batch(vectors, bot.K_DOCUMENTOS) if documentos is not None
+                       else [[] for _ in pending])
+            for i, vector, hits, chunks in zip(pending, vectors, faq_hits, trechos):
+                results[i] = ([(faq_id, retriever.answer(faq_id)) for faq_id, _ in hits],
+                              [t for t in chunks if t["distance"] <= bot.DISTANCIA_MAXIMA], vector)
+        return results
+
+    def answer(self, question, faq, trechos, embedding):
+        """Returns the answer record for one retrieved question (without its ID)."""
+        record = {"question": question, "faq_ids": [faq_id for faq_id, _ in faq],
+                  "sources": [f"{t['source']}, p. {t['page']}" for t in trechos]}
+        if not faq and not trechos:
+            return {**record, "status": "sem_contexto", "answer": CustomDataChatbot.RESPOSTA_SEM_CONTEXTO}
+        contexto = CustomDataChatbot.montar_contexto(faq, trechos)
+        entrada_faq = (tuple(record["faq_ids"]), contexto)
+        answer_cache = None
+        if embedding is not None:
+            # Mesmo cache semântico do chat: perguntas quase iguais não chamam o modelo de novo
+            answer_cache = get_answer_cache(self.embedder.model, len(embedding))
+            cached = answer_cache.lookup(embedding, entrada_faq)
+            if cached is not None:
+                return {**record, "status": "cache", "answer": cached}
+        with tracing.turn("batch.answer"):
+            answer = "".join(prompts.CONSULTOR.complete(
+                self.client, self.model, [], question, context={"CONTEUDO_RELEVANTE": contexto},
+                stream=False)).strip()
+        if answer_cache is not None:
+            answer_cache.store(embedding, entrada_faq, answer)
+        return {**record, "status": "modelo", "answer": answer}
+
+    def run(self, questions, output_path):
+        """Answers `questions` ((id, question) pairs) into `output_path`, resuming it.
+
+        IDs already in the output are skipped. Failed questions are reported
+        and left out of the file, so the next run retries them.
+
+        Returns:
+            dict: counts by status, skipped and failed questions, and elapsed seconds
+        """
+        done = load_checkpoint(output_path)
+        counts = {"modelo": 0, "cache": 0, "sem_contexto": 0, "skipped": 0, "errors": 0}
+        questions = iter(questions)
+        start = time.perf_counter()
+        with open(output_path, "a", encoding="utf-8") as out, \
+                ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="ibelt-batch") as executor:
+            in_flight = {}
+
+            def collect(until):
+                # Grava as respostas prontas; espera enquanto houver mais de `until` em andamento
+                while len(in_flight) > until:
+                    finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        question_id = in_flight.pop(future)
+                        try:
+                            record = future.result()
+                        except Exception as e:
+                            counts["errors"] += 1
+                            print(f"Erro na pergunta {question_id}: {e}")
+                            continue
+                        counts[record["status"]] += 1
+                        out.write(json.dumps({"id": question_id, **record}, ensure_ascii=False) + "\n")
+                        out.flush()
+
+            while chunk := list(islice(questions, self.batch_size)):
+                new = []
+                for question_id, question in chunk:
+                    if question_id in done:
+                        counts["skipped"] += 1
+                    else:
+                        done.add(question_id)
+                        new.append((question_id, question))
+                if not new:
+                    continue
+                retrieved = self.retrieve([question for _, question in new])
+                # Janela limitada: o próximo lote é buscado enquanto este ainda está no modelo
+                collect(self.concurrency)
+                for (question_id, question), (faq, trechos, embedding) in zip(new, retrieved):
+                    in_flight[executor.submit(self.answer, question, faq, trechos, embedding)] = question_id
+            collect(0)
+        counts["seconds"] = time.perf_counter() - start
+        return counts
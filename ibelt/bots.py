@@ -0,0 +1,374 @@
+import re
+import threading
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from ibelt import llm, prompts, tracing
+from ibelt.answer_cache import get_answer_cache
+from ibelt.documents import get_document_index
+from ibelt.embeddings import get_embedder
+from ibelt.faq import FAQ_DATA
+from ibelt.leads import LeadRecord, extract_lead_delta
+from ibelt.memory import ConversationMemory
+from ibelt.retriever import get_retriever
+from ibelt.sessions import TurnConflictError
+
+SAUDACAO = "Olá, sou o Agente Comercial da Pieracciani. \nQual o seu nome?"
+
+
+class CustomDataChatbot:
+    # Recuperação: até K_FAQ entradas com distância L2² até DISTANCIA_MAXIMA, diversificadas por MMR
+    K_FAQ = 3
+    K_DOCUMENTOS = 2
+    DISTANCIA_MAXIMA = 1.2
+    MMR_LAMBDA = 0.7
+    # Busca híbrida: candidatos do BM25 abaixo deste escore (só termos comuns) são ignorados
+    BM25_MINIMO = 2.0
+    RESPOSTA_SEM_CONTEXTO = "Não tenho informações suficientes para responder essa pergunta."
+
+    def __init__(self, faq_data=FAQ_DATA, store=None, conversa=None, client=None, embedder=None):
+        self.faq_data = faq_data
+        # Cliente e índice são compartilhados pelo processo; só o histórico é da conversa
+        self.client = client or llm.get_client()
+        self.embedder = embedder or get_embedder()
+        # Com um store, cada turno é gravado e uma conversa existente é retomada
+        self.memoria = ConversationMemory(self.client, model="gpt-4o", store=store, conversation_id=conversa)
+
+    @property
+    def historico_conversa(self):
+        return self.memoria.turns
+
+    @property
+    def retriever(self):
+        return get_retriever(self.faq_data, self.embedder.embed, self.embedder.model)
+
+    def obter_embedding_real(self, text):
+        return self.embedder.embed_query(text)
+
+    def buscar_faq(self, pergunta, pergunta_embedding):
+        """Retorna [(id, resposta)] das entradas do FAQ relevantes, fundindo busca vetorial e BM25."""
+        retriever = self.retriever
+        resultados = retriever.search_hybrid(
+            pergunta_embedding, pergunta, k=self.K_FAQ, max_distance=self.DISTANCIA_MAXIMA,
+            mmr_lambda=self.MMR_LAMBDA, min_lexical_score=self.BM25_MINIMO)
+        return [(faq_id, retriever.answer(faq_id)) for faq_id, _ in resultados]
+
+    def buscar_faq_exata(self, pergunta):
+        """Atalho léxico: [(id, resposta)] se a pergunta coincide com uma do FAQ, sem gerar embedding."""
+        retriever = self.retriever
+        faq_id = retriever.lexical_match(pergunta)
+        return [] if faq_id is None else [(faq_id, retriever.answer(faq_id))]
+
+    def buscar_documentos(self, pergunta_embedding):
+        # Índice dos regulamentos em tmp/, gerado offline por `python -m ibelt ingest tmp/`
+        documentos = get_document_index(self.embedder.model)
+        if documentos is None:
+            return []
+        return [t for t in documentos.search(pergunta_embedding, self.K_DOCUMENTOS)
+                if t["distance"] <= self.DISTANCIA_MAXIMA]
+
+    @staticmethod
+    def montar_contexto(faq, trechos):
+        """Conteúdo relevante do prompt: respostas do FAQ e trechos dos documentos com a fonte."""
+        return "\n".join([resposta for _, resposta in faq]
+                         + [f"[{t['source']}, p. {t['page']}] {t['text']}" for t in trechos])
+
+    def encontrar_resposta(self, pergunta):
+        faq = self.buscar_faq_exata(pergunta) or self.buscar_faq(pergunta, self.obter_embedding_real(pergunta))
+        return faq[0][1] if faq else self.RESPOSTA_SEM_CONTEXTO
+
+    def responder_pergunta_com_historico(self, pergunta):
+        return "".join(self.responder_pergunta_em_stream(pergunta, stream=False))
+
+    def responder_pergunta_em_stream(self, pergunta, stream=True):
+        """Gera a resposta em pedaços conforme chegam do modelo.
+
+        O texto completo só entra no histórico depois do último pedaço,
+        então o gerador precisa ser consumido até o fim.
+        """
+        faq = self.buscar_faq_exata(pergunta)
+        if faq:
+            # Pergunta idêntica a uma do FAQ: nenhuma chamada de embedding nem busca nos documentos
+            pergunta_embedding, trechos = None, []
+        else:
+            pergunta_embedding = self.obter_embedding_real(pergunta)
+            faq = self.buscar_faq(pergunta, pergunta_embedding)
+            trechos = self.buscar_documentos(pergunta_embedding)
+        if not faq and not trechos:
+            # Nada relevante o bastante: responde na hora, sem chamar o modelo
+            self.memoria.append("user", pergunta)
+            self.memoria.append("assistant", self.RESPOSTA_SEM_CONTEXTO)
+            yield self.RESPOSTA_SEM_CONTEXTO
+            return
+        resposta_relevante = self.montar_contexto(faq, trechos)
+        # O cache semântico só vale para perguntas sem contexto anterior na conversa
+        entrada_faq = (tuple(faq_id for faq_id, _ in faq), resposta_relevante)
+        usar_cache = not self.historico_conversa and pergunta_embedding is not None
+        if usar_cache:
+            answer_cache = get_answer_cache(self.embedder.model, len(pergunta_embedding))
+            resposta_cache = answer_cache.lookup(pergunta_embedding, entrada_faq)
+            if resposta_cache is not None:
+                self.memoria.append("user", pergunta)
+                self.memoria.append("assistant", resposta_cache)
+                yield resposta_cache
+                return
+        try:
+            # Prefixo estático primeiro; o conteúdo recuperado vai no fim, junto da pergunta
+            partes = []
+            for parte in prompts.CONSULTOR.complete(
+                    self.client, "gpt-4o", self.memoria.messages(), pergunta,
+                    context={"CONTEUDO_RELEVANTE": resposta_relevante}, stream=stream):
+                partes.append(parte)
+                yield parte
+            resposta_texto = "".join(partes).strip()
+            self.memoria.append("user", pergunta)
+            self.memoria.append("assistant", resposta_texto)
+            if usar_cache:
+                answer_cache.store(pergunta_embedding, entrada_faq, resposta_texto)
+        except Exception as e:
+            yield f"Erro ao obter resposta: {str(e)}"
+
+    def responder_turno(self, pergunta):
+        return self.responder_pergunta_em_stream(pergunta)
+
+    def finalizar_turno(self):
+        pass
+
+
+class CommercialAgentChatbot:
+    def __init__(self, store=None, conversa=None, client=None):
+        self.client = client or llm.get_client()
+        # Com um store, histórico e lead são gravados e uma conversa existente é retomada
+        self.store = store
+        self.conversa = conversa
+        self.memoria = ConversationMemory(self.client, model="gpt-4o-mini", store=store, conversation_id=conversa,
+                                          initial=[{"role": "assistant", "content": SAUDACAO}])
+        lead = store.get_state(conversa, "lead") if store is not None else None
+        self.lead = LeadRecord.model_validate(lead or {})
+        self._extracao_lead = None
+
+    @property
+    def lead_data(self):
+        return self.lead.to_prompt()
+
+    @property
+    def historico_conversa(self):
+        return self.memoria.turns
+
+    def responder_pergunta_com_historico(self, pergunta):
+        return "".join(self.responder_pergunta_em_stream(pergunta, stream=False))
+
+    def responder_pergunta_em_stream(self, pergunta, stream=True):
+        """Gera a resposta em pedaços conforme chegam do modelo.
+
+        O texto completo só entra no histórico depois do último pedaço,
+        então o gerador precisa ser consumido até o fim.
+        """
+        try:
+            # Prefixo estático primeiro; os dados do lead mudam a cada turno e vão no fim
+            partes = []
+            for parte in prompts.AGENTE_COMERCIAL.complete(
+                    self.client, "gpt-4o-mini", self.memoria.messages(), pergunta,
+                    context={"LEAD_DATA": self.lead_data}, stream=stream):
+                partes.append(parte)
+                yield parte
+            resposta_texto = "".join(partes).strip()
+            self.memoria.append("user", pergunta)
+            self.memoria.append("assistant", resposta_texto)
+        except Exception as e:
+            yield f"Erro ao obter resposta: {str(e)}"
+
+    def agendar_lead_data(self, question, awnser):
+        """Extrai o lead em segundo plano enquanto a resposta é gerada.
+
+        Espera a extração do turno anterior antes de agendar a nova, então
+        as extrações rodam na ordem dos turnos e, chamando este método antes
+        de `responder_pergunta_em_stream`, o prompt já vê o lead mesclado.
+        """
+        self.aguardar_lead_data()
+        self._extracao_lead = llm.submit(self.save_lead_data, question, awnser)
+        return self._extracao_lead
+
+    def aguardar_lead_data(self):
+        if self._extracao_lead is not None:
+            with tracing.span("lead.wait"):
+                self._extracao_lead.result()
+            self._extracao_lead = None
+        return self.lead_data
+
+    def save_lead_data(self, question, awnser):
+        # Só a troca atual vai para o modelo; a mescla com o lead é local
+        try:
+            delta = extract_lead_delta(self.client, question, awnser)
+            with tracing.span("lead.merge") as span:
+                self.lead = self.lead.merge(delta)
+                # Só a contagem vai para o trace: os dados do lead são pessoais
+                span.set(fields=len(self.lead.model_dump(exclude_none=True)))
+            if self.store is not None:
+                # Gravado em lote fora do turno; sobrevive a reinícios do worker
+                self.store.put_state(self.conversa, "lead", self.lead.model_dump(exclude_none=True))
+            return self.lead_data
+        except Exception as e:
+            print(f"Erro ao extrair lead: {e}")
+            return f"Erro ao obter resposta: {str(e)}"
+
+    def setLeadData(self, lead_data):
+        self.lead = LeadRecord.model_validate_json(lead_data)
+        if self.store is not None:
+            self.store.put_state(self.conversa, "lead", self.lead.model_dump(exclude_none=True))
+
+    def responder_turno(self, pergunta):
+        """Agenda a extração do lead sobre a última pergunta do agente e responde."""
+        ultima = next((t["content"] for t in reversed(self.historico_conversa) if t["role"] == "assistant"), "")
+        self.agendar_lead_data(ultima, pergunta)
+        return self.responder_pergunta_em_stream(pergunta)
+
+    def finalizar_turno(self):
+        """Espera a extração do lead deste turno, que em geral já terminou junto com a resposta."""
+        self.aguardar_lead_data()
+
+
+# Nome do bot (também o prefixo das conversas no store) -> classe
+BOTS = {
+    "consultor": CustomDataChatbot,
+    "agente_comercial": CommercialAgentChatbot,
+}
+
+
+# IDs aceitos de clientes (vão na URL e no store)
+CONVERSATION_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+def new_conversation_id():
+    return uuid.uuid4().hex
+
+
+class Reply:
+    """Text fragments of one turn; `trace` is set once they have all been read.
+
+    If a span is current when the fragments are first read (the page opened
+    the turn so that rendering is traced with it), the bot's stages join
+    that trace; otherwise the reply opens a "<bot>.turn" trace of its own.
+    `close()` abandons the turn early (e.g. the client disconnected): the
+    model call is cancelled and nothing is added to the history.
+    """
+
+    def __init__(self, pool, bot, conversation_id, message):
+        self.trace = None
+        self._pieces = self._run(pool, bot, conversation_id, message)
+
+    def _run(self, pool, bot, conversation_id, message):
+        with pool.turn(bot, conversation_id) as chatbot:
+            parent = tracing.current_span()
+            if parent is not None:
+                yield from chatbot.responder_turno(message)
+                self.trace = parent.trace
+                return
+            with tracing.turn(f"{bot}.turn") as trace:
+                yield from chatbot.responder_turno(message)
+            self.trace = trace
+
+    def __iter__(self):
+        return self._pieces
+
+    def close(self):
+        self._pieces.close()
+
+
+class _Conversation:
+    # Chatbot e lock do turno ficam na mesma entrada do LRU: saem juntos, e só quando o lock está livre
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.chatbot = None
+
+
+class ConversationPool:
+    """Live chatbots by conversation, shared by every client of the process.
+
+    Chatbots are created on first use and resume their conversation from the
+    session store. Every turn first checks the chatbot against the store's
+    newest seq, rebuilding it if another worker has answered since, and
+    commits its turns before the conversation is released, so workers
+    sharing a SQLite store can take turns on a conversation. Turns of one
+    conversation overlapping on two workers fail with `TurnConflictError`
+    instead of overwriting each other. A turn also waits for its background
+    lead extraction before releasing the conversation. Turns of one
+    conversation run one at a time; different conversations run in parallel
+    and share the process-wide LLM client, embedder and retriever. The least
+    recently used conversations are dropped past `max_conversations` (their
+    state is already in the store), except those with a turn running.
+
+    Args:
+        store: session store, see `ibelt.sessions`
+        max_conversations (int): chatbots kept in memory
+    """
+
+    def __init__(self, store, max_conversations=10_000):
+        self.store = store
+        self.max_conversations = max_conversations
+        self._conversations = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(bot, conversation_id):
+        return f"{bot}/{conversation_id}"
+
+    def _entry(self, key):
+        with self._lock:
+            entry = self._conversations.get(key)
+            if entry is None:
+                entry = self._conversations[key] = _Conversation()
+            self._conversations.move_to_end(key)
+            excess = len(self._conversations) - self.max_conversations
+            if excess > 0:
+                idle = [k for k, e in self._conversations.items() if k != key and not e.lock.locked()][:excess]
+                for k in idle:
+                    del self._conversations[k]
+            return entry
+
+    @contextmanager
+    def turn(self, bot, conversation_id):
+        """Holds the conversation's turn lock and yields its chatbot, in sync with the store."""
+        key = self.key(bot, conversation_id)
+        while True:
+            entry = self._entry(key)
+            entry.lock.acquire()
+            # Removida entre a busca e o lock: outro turno já pode ter criado uma entrada nova
+            with self._lock:
+                if self._conversations.get(key) is entry:
+                    break
+            entry.lock.release()
+        try:
+            if entry.chatbot is None or entry.chatbot.memoria.last_seq != self.store.last_seq(key):
+                # Conversa nova aqui, ou outro worker respondeu desde o último turno: relê do store
+                entry.chatbot = BOTS[bot](store=self.store, conversa=key)
+            try:
+                yield entry.chatbot
+            finally:
+                # Tarefas do turno (extração do lead) terminam antes de soltar a conversa: o
+                # chatbot pode sair do LRU ou ser relido, e nada grava estado atrasado depois
+                entry.chatbot.finalizar_turno()
+            # Grava o turno antes de soltar a conversa: o worker do próximo turno já o vê
+            self.store.flush()
+        except TurnConflictError:
+            # O histórico em memória tem turnos que o store recusou; o próximo turno relê
+            entry.chatbot = None
+            raise
+        finally:
+            entry.lock.release()
+
+    def get(self, bot, conversation_id):
+        """Returns the conversation's chatbot, waiting for a running turn to end."""
+        with self.turn(bot, conversation_id) as chatbot:
+            return chatbot
+
+    def reply(self, bot, conversation_id, message):
+        """Starts a turn; iterate the returned `Reply` to get the answer text."""
+        return Reply(self, bot, conversation_id, message)
+
+    def history(self, bot, conversation_id, before=None, limit=20):
+        return self.store.load_turns(self.key(bot, conversation_id), before=before, limit=limit)
+
+    def lead(self, conversation_id):
+        return self.store.get_state(self.key("agente_comercial", conversation_id), "lead") or {}
@@ -0,0 +1,118 @@
+import json
+import os
+import threading
+
+import httpx
+
+from ibelt import tracing
+from ibelt.bots import ConversationPool
+from ibelt.sessions import Turn, get_session_store
+
+
+class HTTPReply:
+    """Text fragments of a reply streamed over SSE; `trace` is set by the final event.
+
+    The breakdown is the service's, plus the stages recorded here (e.g.
+    "render") when the reply is read inside a turn opened by the caller.
+    """
+
+    def __init__(self, response_context):
+        self._server_trace = None
+        self._parent = None
+        self._context = response_context
+
+    @property
+    def trace(self):
+        if self._server_trace is None:
+            return None
+        breakdown = list(self._server_trace["breakdown"])
+        if self._parent is not None:
+            breakdown += [row for row in self._parent.trace.breakdown() if row["depth"] > 0]
+        return {"trace_id": self._server_trace["trace_id"], "breakdown": breakdown}
+
+    def __iter__(self):
+        self._parent = tracing.current_span()
+        with self._context as response:
+            if response.status_code != 200:
+                response.read()
+                raise RuntimeError(f"API respondeu {response.status_code}: {response.text}")
+            event = None
+            for line in response.iter_lines():
+                if line.startswith("event: "):
+                    event = line[len("event: "):]
+                elif line.startswith("data: "):
+                    data = json.loads(line[len("data: "):])
+                    if event == "token":
+                        yield data["text"]
+                    elif event == "done":
+                        self._server_trace = {"trace_id": data.get("trace_id"),
+                                              "breakdown": data.get("breakdown", [])}
+                    elif event == "error":
+                        raise RuntimeError(data["error"])
+
+
+class HTTPChatClient:
+    """Client of the chatbot API (`ibelt.server`) over one pooled HTTP connection set.
+
+    Args:
+        base_url (str): API root, e.g. "http://127.0.0.1:8080"
+        timeout (float): seconds without data before a request fails
+    """
+
+    def __init__(self, base_url, timeout=120.0):
+        self._http = httpx.Client(base_url=base_url.rstrip("/"), timeout=timeout)
+
+    def reply(self, bot, conversation_id, message):
+        return HTTPReply(self._http.stream(
+            "POST", f"/v1/{bot}/conversations/{conversation_id}/messages", json={"message": message}))
+
+    def history(self, bot, conversation_id, before=None, limit=20):
+        params = {"limit": limit} if before is None else {"limit": limit, "before": before}
+        response = self._http.get(f"/v1/{bot}/conversations/{conversation_id}/messages", params=params)
+        response.raise_for_status()
+        return [Turn(**m) for m in response.json()["messages"]]
+
+
+class LocalChatClient:
+    """Same interface as `HTTPChatClient`, running the chatbots in this process."""
+
+    def __init__(self, pool=None):
+        self.pool = pool or ConversationPool(get_session_store())
+
+    def reply(self, bot, conversation_id, message):
+        reply = self.pool.reply(bot, conversation_id, message)
+        return _LocalReply(reply)
+
+    def history(self, bot, conversation_id, before=None, limit=20):
+        return self.pool.history(bot, conversation_id, before=before, limit=limit)
+
+
+class _LocalReply:
+    def __init__(self, reply):
+        self._reply = reply
+
+    @property
+    def trace(self):
+        trace = self._reply.trace
+        return None if trace is None else {"trace_id": trace.trace_id, "breakdown": trace.breakdown()}
+
+    def __iter__(self):
+        return iter(self._reply)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_chat_client():
+    """Returns the process-wide chat client.
+
+    With `IBELT_API_URL` set the chatbots are reached through the API
+    service (`python -m ibelt serve`); otherwise they run in this process.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            url = os.environ.get("IBELT_API_URL")
+            _client = HTTPChatClient(url) if url else LocalChatClient()
+        return _client
@@ -0,0 +1,266 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import islice
+
+import faiss
+import numpy as np
+
+from ibelt import embeddings, index_backends, indexing, tracing
+
+DOCUMENTS_INDEX_PATH = "indice_documentos.index"
+
+
+def store_path(index_path):
+    return index_path + ".chunks.sqlite"
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def iter_pages(path):
+    """Yields (page_number, text) for each page of a PDF, one page at a time."""
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    for number, page in enumerate(reader.pages, start=1):
+        yield number, page.extract_text() or ""
+
+
+def iter_chunks(pages, source, chunk_size=1200, overlap=200):
+    """Splits a page stream into overlapping chunks with source/page metadata.
+
+    Text left over at the end of a page is carried into the next one, so
+    chunks may span pages; `page` is the page where the chunk starts.
+
+    Args:
+        pages (Iterable[tuple]): (page_number, text) pairs
+        source (str): document name stored with every chunk
+        chunk_size (int): maximum chunk length in characters
+        overlap (int): characters repeated between consecutive chunks
+    """
+    carry, carry_page = "", None
+    for number, text in pages:
+        text = " ".join(text.split())
+        if not text:
+            continue
+        if carry:
+            buffer, boundary = f"{carry} {text}", len(carry)
+        else:
+            buffer, boundary, carry_page = text, 0, number
+        start = 0
+        while len(buffer) - start > chunk_size:
+            end = buffer.rfind(" ", start + 1, start + chunk_size)
+            if end == -1:
+                end = start + chunk_size
+            page = carry_page if start < boundary else number
+            yield {"text": buffer[start:end].strip(), "source": source, "page": page}
+            next_start = buffer.find(" ", end - overlap, end)
+            start = next_start + 1 if next_start > start else end
+        if start >= boundary:
+            carry_page = number
+        carry = buffer[start:]
+    if carry.strip():
+        yield {"text": carry.strip(), "source": source, "page": carry_page}
+
+
+def _batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def _ingest_file(path, work_dir, batch_size):
+    """Worker: embeds one PDF into a shard (`<sha>.f32` + `<sha>.jsonl`) in `work_dir`."""
+    digest = file_sha256(path)
+    shard = os.path.join(work_dir, digest)
+    if os.path.exists(shard + ".done"):
+        return path, digest
+    embedder = embeddings.get_embedder()
+    count, dimension = 0, None
+    with open(shard + ".f32.part", "wb") as vectors, open(shard + ".jsonl.part", "w", encoding="utf-8") as meta:
+        for batch in _batched(iter_chunks(iter_pages(path), os.path.basename(path)), batch_size):
+            matrix = np.ascontiguousarray(embedder.embed([c["text"] for c in batch]), dtype="float32")
+            dimension = matrix.shape[1]
+            vectors.write(matrix.tobytes())
+            meta.writelines(json.dumps(c, ensure_ascii=False) + "\n" for c in batch)
+            count += len(batch)
+    os.replace(shard + ".f32.part", shard + ".f32")
+    os.replace(shard + ".jsonl.part", shard + ".jsonl")
+    with open(shard + ".done", "w", encoding="utf-8") as f:
+        json.dump({"chunks": count, "dimension": dimension, "model": embedder.model}, f)
+    return path, digest
+
+
+def _open_store(index_path):
+    db = sqlite3.connect(store_path(index_path), check_same_thread=False)
+    db.executescript("""
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+        CREATE TABLE IF NOT EXISTS files (sha256 TEXT PRIMARY KEY, path TEXT NOT NULL, chunks INTEGER NOT NULL);
+        CREATE TABLE IF NOT EXISTS chunks (
+            id INTEGER PRIMARY KEY, file_sha256 TEXT NOT NULL,
+            source TEXT NOT NULL, page INTEGER, text TEXT NOT NULL);
+    """)
+    return db
+
+
+def _merge_shard(db, index, index_path, path, digest, work_dir, model, batch_size):
+    shard = os.path.join(work_dir, digest)
+    with open(shard + ".done", encoding="utf-8") as f:
+        info = json.load(f)
+    if info["model"] != model:
+        raise ValueError(f"{path} foi embutido com {info['model']}, mas o índice usa {model}.")
+    if info["chunks"]:
+        if index is None:
+            index = faiss.IndexIDMap(faiss.IndexFlatL2(info["dimension"]))
+        vectors = np.memmap(shard + ".f32", dtype="float32", mode="r").reshape(-1, info["dimension"])
+        (next_id,) = db.execute("SELECT COALESCE(MAX(id) + 1, 0) FROM chunks").fetchone()
+        with open(shard + ".jsonl", encoding="utf-8") as meta:
+            for start, batch in zip(range(0, info["chunks"], batch_size), _batched(meta, batch_size)):
+                ids = np.arange(next_id + start, next_id + start + len(batch), dtype="int64")
+                # Idempotente: uma execução interrompida pode ter gravado estes IDs no índice
+                index.remove_ids(ids)
+                index.add_with_ids(np.ascontiguousarray(vectors[start:start + len(batch)]), ids)
+                rows = [json.loads(line) for line in batch]
+                db.executemany(
+                    "INSERT INTO chunks (id, file_sha256, source, page, text) VALUES (?, ?, ?, ?, ?)",
+                    [(int(i), digest, r["source"], r["page"], r["text"]) for i, r in zip(ids, rows)])
+        del vectors
+        tmp_path = index_path + ".tmp"
+        faiss.write_index(index, tmp_path)
+        os.replace(tmp_path, index_path)
+    db.execute("INSERT INTO files (sha256, path, chunks) VALUES (?, ?, ?)", (digest, path, info["chunks"]))
+    db.commit()
+    for suffix in (".f32", ".jsonl", ".done"):
+        os.remove(shard + suffix)
+    print(f"{path}: {info['chunks']} trechos indexados.")
+    return index
+
+
+def list_pdfs(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(os.path.join(path, name) for name in sorted(os.listdir(path))
+                         if name.lower().endswith(".pdf"))
+        else:
+            files.append(path)
+    return files
+
+
+def ingest(paths, index_path=None, workers=None, batch_size=128):
+    """Builds or extends the document index from PDFs, one worker process per file.
+
+    Workers stream pages into chunks, embed them in batches and write a
+    shard to disk; the parent appends each finished shard to the FAISS index
+    and records the file's hash. Re-running skips files already indexed and
+    reuses finished shards, so an interrupted ingestion resumes.
+
+    Args:
+        paths (list): PDF files or directories containing PDFs
+        index_path (str): FAISS index to create or extend (default:
+            `DOCUMENTS_INDEX_PATH` for the current embedding model)
+        workers (int): size of the process pool (default: CPU count)
+        batch_size (int): chunks per embedding request
+
+    Returns:
+        int: number of files ingested
+    """
+    model = embeddings.get_embedder().model
+    index_path = index_path or indexing.model_index_path(DOCUMENTS_INDEX_PATH, model)
+    work_dir = index_path + ".work"
+    os.makedirs(work_dir, exist_ok=True)
+    db = _open_store(index_path)
+    stored_model = db.execute("SELECT value FROM meta WHERE key = 'model'").fetchone()
+    if stored_model is None:
+        db.execute("INSERT INTO meta (key, value) VALUES ('model', ?)", (model,))
+        db.commit()
+    elif stored_model[0] != model:
+        raise ValueError(f"{index_path} usa o modelo {stored_model[0]}, mas o embedder atual é {model}.")
+
+    done = {row[0] for row in db.execute("SELECT sha256 FROM files")}
+    pending = [path for path in list_pdfs(paths) if file_sha256(path) not in done]
+    if not pending:
+        print("Nenhum documento novo para indexar.")
+        return 0
+
+    index = faiss.read_index(index_path) if os.path.exists(index_path) else None
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_ingest_file, path, work_dir, batch_size) for path in pending]
+        for future in as_completed(futures):
+            path, digest = future.result()
+            index = _merge_shard(db, index, index_path, path, digest, work_dir, model, batch_size)
+    db.close()
+    return len(pending)
+
+
+class DocumentIndex:
+    """Read-only view of an ingested document index and its chunk metadata."""
+
+    def __init__(self, index_path, mmap=False):
+        self.path = index_path
+        self.signature = os.stat(index_path).st_mtime_ns
+        self.index = index_backends.read_index(index_path, mmap=mmap)
+        self._db = sqlite3.connect(f"file:{store_path(index_path)}?mode=ro", uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+        (self.model,) = self._db.execute("SELECT value FROM meta WHERE key = 'model'").fetchone()
+
+    def search(self, embedding, k=2):
+        """Returns up to `k` chunks as dicts with text, source, page and distance."""
+        return self.search_batch(np.asarray(embedding, dtype="float32").reshape(1, -1), k)[0]
+
+    def search_batch(self, embeddings, k=2):
+        """`search` for an (n, d) matrix of queries, with one `index.search` call."""
+        queries = np.ascontiguousarray(embeddings, dtype="float32")
+        with tracing.span("faiss.search", index="documents", k=k, queries=len(queries)):
+            distances, ids = self.index.search(queries, k)
+        results = []
+        with self._lock:
+            for row_distances, row_ids in zip(distances, ids):
+                chunks = []
+                for distance, chunk_id in zip(row_distances, row_ids):
+                    if chunk_id < 0:
+                        continue
+                    source, page, text = self._db.execute(
+                        "SELECT source, page, text FROM chunks WHERE id = ?", (int(chunk_id),)).fetchone()
+                    chunks.append({"id": int(chunk_id), "source": source, "page": page,
+                                   "text": text, "distance": float(distance)})
+                results.append(chunks)
+        return results
+
+
+_document_indexes = {}
+_document_indexes_lock = threading.Lock()
+
+
+def get_document_index(model, index_path=None):
+    """Returns the process-wide document index, or None if it was not built for `model`.
+
+    The web process only reads the index; it is built offline with
+    `python -m ibelt ingest tmp/` and reloaded when the file changes.
+    """
+    index_path = index_path or indexing.model_index_path(DOCUMENTS_INDEX_PATH, model)
+    if not os.path.exists(index_path):
+        return None
+    with _document_indexes_lock:
+        current = _document_indexes.get(index_path)
+        if current is None or current.signature != os.stat(index_path).st_mtime_ns:
+            with tracing.span("index.load", index="documents", mmap=index_backends.MMAP_ENABLED) as span:
+                current = DocumentIndex(index_path, mmap=index_backends.MMAP_ENABLED)
+                span.set(vectors=current.index.ntotal)
+            _document_indexes[index_path] = current
+    return current if current.model == model else None
+
+
+def evict_document_index(index_path):
+    """Forgets the document index loaded for `index_path`; the next lookup reads it again."""
+    with _document_indexes_lock:
+        _document_indexes.pop(index_path, None)
@@ -0,0 +1,144 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from ibelt import tracing
+from ibelt.tokens import count_tokens
+
+CACHE_DIR = os.environ.get("IBELT_CACHE_DIR", ".cache")
+
+
+def normalize_query(text):
+    return " ".join(text.lower().split())
+
+
+class QueryEmbeddingCache:
+    """Two-tier cache of query embeddings keyed by normalised text and model.
+
+    An in-memory LRU sits in front of a SQLite table; both tiers are capped
+    and evict least-recently-used entries. Safe to share between threads.
+    """
+
+    def __init__(self, path, memory_size=1024, max_disk_entries=50_000):
+        self.memory_size = memory_size
+        self.max_disk_entries = max_disk_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS query_embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)")
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS query_embeddings_last_used ON query_embeddings (last_used)")
+        self._db.commit()
+
+    @staticmethod
+    def key(text, model):
+        return hashlib.sha256(f"{model}\0{normalize_query(text)}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key, vector):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def get(self, text, model):
+        key = self.key(text, model)
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return vector
+            row = self._db.execute(
+                "SELECT vector FROM query_embeddings WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._db.execute(
+                "UPDATE query_embeddings SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+            vector = np.frombuffer(row[0], dtype="float32")
+            self._remember(key, vector)
+            self.disk_hits += 1
+            return vector
+
+    def put(self, text, model, vector):
+        key = self.key(text, model)
+        vector = np.asarray(vector, dtype="float32")
+        with self._lock:
+            self._remember(key, vector)
+            self._db.execute(
+                "INSERT OR REPLACE INTO query_embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                (key, vector.tobytes(), time.time()))
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        (count,) = self._db.execute("SELECT COUNT(*) FROM query_embeddings").fetchone()
+        excess = count - self.max_disk_entries
+        if excess > 0:
+            # Remove um lote extra para não pagar a remoção a cada inserção
+            excess += self.max_disk_entries // 10
+            self._db.execute(
+                "DELETE FROM query_embeddings WHERE key IN ("
+                "SELECT key FROM query_embeddings ORDER BY last_used LIMIT ?)", (excess,))
+
+    def stats(self):
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+        }
+
+
+class CachedEmbedder:
+    """Embedder wrapper that serves query embeddings from a `QueryEmbeddingCache`.
+
+    Bulk `embed` calls (index builds) bypass the cache.
+    """
+
+    def __init__(self, embedder, cache):
+        self.embedder = embedder
+        self.cache = cache
+
+    @property
+    def model(self):
+        return self.embedder.model
+
+    @property
+    def dimension(self):
+        return self.embedder.dimension
+
+    def embed(self, texts):
+        return self.embedder.embed(texts)
+
+    def unload(self):
+        """Frees the model of a local embedder; remote embedders hold nothing to free."""
+        unload = getattr(self.embedder, "unload", None)
+        if unload is not None:
+            unload()
+
+    def embed_query(self, text):
+        with tracing.span("embedding.query", **{"gen_ai.request.model": self.model}) as span:
+            vector = self.cache.get(text, self.model)
+            span.set(cache_hit=vector is not None)
+            if vector is None:
+                vector = self.embedder.embed_query(text)
+                self.cache.put(text, self.model, vector)
+                span.set(**{"gen_ai.usage.input_tokens": count_tokens(text, self.model)})
+        return vector
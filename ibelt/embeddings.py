@@ -0,0 +1,222 @@
+import hashlib
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import openai
+
+from ibelt import llm, tracing
+from ibelt.embedding_cache import CACHE_DIR, CachedEmbedder, QueryEmbeddingCache
+from ibelt.tokens import count_tokens
+
+MODEL_DIMENSIONS = {
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+    "text-embedding-ada-002": 1536,
+}
+
+# Modelo multilíngue pequeno (118M parâmetros), bom em português na CPU
+LOCAL_EMBEDDING_MODEL = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+
+
+def _clean(text):
+    return text.replace("\n", " ")
+
+
+class OpenAIEmbedder:
+    """Batch embedding engine on top of the OpenAI embeddings endpoint.
+
+    Inputs are split into batches bounded by item count and token budget,
+    a bounded number of batches run concurrently, rate-limited batches are
+    retried with exponential backoff and every batch writes its rows straight
+    into one preallocated float32 matrix.
+    """
+
+    def __init__(self, client, model=llm.EMBEDDING_MODEL, max_batch_size=2048,
+                 max_batch_tokens=300_000, max_concurrency=4, max_retries=6,
+                 base_delay=1.0):
+        self.client = client
+        self.model = model
+        self.dimension = MODEL_DIMENSIONS.get(model)
+        self.max_batch_size = max_batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+
+    def plan_batches(self, texts):
+        """Splits `texts` into (start, end) ranges that respect both batch limits."""
+        batches = []
+        start, tokens = 0, 0
+        for i, text in enumerate(texts):
+            n_tokens = count_tokens(text, self.model)
+            if i > start and (i - start >= self.max_batch_size or tokens + n_tokens > self.max_batch_tokens):
+                batches.append((start, i))
+                start, tokens = i, 0
+            tokens += n_tokens
+        if start < len(texts):
+            batches.append((start, len(texts)))
+        return batches
+
+    def _request(self, texts):
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.client.embeddings.create(input=texts, model=self.model)
+                return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+            except (openai.RateLimitError, openai.APITimeoutError):
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(self.base_delay * 2 ** attempt * (1 + random.random()))
+
+    def embed(self, texts):
+        """Embeds `texts` into an (n, dimension) float32 matrix, in input order."""
+        texts = [_clean(text) for text in texts]
+        batches = self.plan_batches(texts)
+        if not batches:
+            return np.empty((0, self.dimension or 0), dtype="float32")
+        first = None
+        if self.dimension is None:
+            # Modelo desconhecido: o primeiro lote define a dimensão
+            first = self._request(texts[slice(*batches[0])])
+            self.dimension = len(first[0])
+        out = np.empty((len(texts), self.dimension), dtype="float32")
+        if first is not None:
+            out[slice(*batches[0])] = first
+            batches = batches[1:]
+
+        def run(batch):
+            start, end = batch
+            out[start:end] = self._request(texts[start:end])
+
+        if len(batches) == 1:
+            run(batches[0])
+        elif batches:
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+                list(pool.map(run, batches))
+        return out
+
+    def embed_query(self, text):
+        return self.embed([text])[0]
+
+
+class LocalEmbedder:
+    """CPU embedding engine running a sentence-transformers model in process.
+
+    The model is loaded on first use, so importing this module or building
+    the embedder costs nothing. `backend="onnx"` runs the ONNX export through
+    onnxruntime instead of PyTorch. Vectors are L2-normalised.
+
+    Args:
+        model_name (str): Hugging Face model id or local path
+        threads (int): intra-op threads for inference (default: library default)
+        batch_size (int): texts per forward pass
+        backend (str): "torch" or "onnx"
+    """
+
+    def __init__(self, model_name=LOCAL_EMBEDDING_MODEL, threads=None, batch_size=64, backend="torch"):
+        self.model_name = model_name
+        # O prefixo separa os índices e caches deste modelo dos da OpenAI
+        self.model = f"local:{model_name}"
+        self.threads = threads
+        self.batch_size = batch_size
+        self.backend = backend
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._model is None:
+                try:
+                    from sentence_transformers import SentenceTransformer
+                except ImportError as e:
+                    raise ImportError("O embedder local requer `pip install sentence-transformers`"
+                                      " (e `onnxruntime` para backend='onnx').") from e
+                if self.threads:
+                    import torch
+                    torch.set_num_threads(self.threads)
+                with tracing.span("embedding.model_load", model=self.model_name, backend=self.backend):
+                    self._model = SentenceTransformer(self.model_name, device="cpu", backend=self.backend)
+        return self._model
+
+    def unload(self):
+        """Frees the model; it is loaded again on the next call."""
+        with self._lock:
+            self._model = None
+
+    @property
+    def dimension(self):
+        return self._load().get_sentence_embedding_dimension()
+
+    def embed(self, texts):
+        """Embeds `texts` into an (n, dimension) float32 matrix, in input order."""
+        model = self._load()
+        if not texts:
+            return np.empty((0, model.get_sentence_embedding_dimension()), dtype="float32")
+        vectors = model.encode([_clean(text) for text in texts], batch_size=self.batch_size,
+                               convert_to_numpy=True, normalize_embeddings=True)
+        return np.ascontiguousarray(vectors, dtype="float32")
+
+    def embed_query(self, text):
+        return self.embed([text])[0]
+
+
+class FakeEmbedder:
+    """Deterministic offline embedder: each text maps to a fixed unit vector.
+
+    Identical texts (after whitespace normalisation) always get identical
+    vectors, so index builds and tests are reproducible without network.
+    """
+
+    def __init__(self, dimension=64):
+        self.dimension = dimension
+        self.model = f"fake-{dimension}"
+
+    def _vector(self, text):
+        normalized = " ".join(text.split()).lower()
+        seed = int.from_bytes(hashlib.sha256(normalized.encode("utf-8")).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(self.dimension).astype("float32")
+        return vector / np.linalg.norm(vector)
+
+    def embed(self, texts):
+        out = np.empty((len(texts), self.dimension), dtype="float32")
+        for i, text in enumerate(texts):
+            out[i] = self._vector(text)
+        return out
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+
+_embedder = None
+_embedder_lock = threading.Lock()
+
+
+def get_embedder():
+    """Returns the process-wide embedder.
+
+    Set `IBELT_EMBEDDER=local` to embed on the CPU with `LocalEmbedder`
+    (model from `IBELT_LOCAL_MODEL`, threads from `IBELT_EMBEDDER_THREADS`,
+    runtime from `IBELT_LOCAL_BACKEND`), or `IBELT_EMBEDDER=fake` for the
+    deterministic offline embedder. Query embeddings are served from the
+    on-disk query cache.
+    """
+    global _embedder
+    with _embedder_lock:
+        if _embedder is None:
+            kind = os.environ.get("IBELT_EMBEDDER", "openai")
+            if kind == "fake":
+                embedder = FakeEmbedder()
+            elif kind == "local":
+                embedder = LocalEmbedder(
+                    os.environ.get("IBELT_LOCAL_MODEL", LOCAL_EMBEDDING_MODEL),
+                    threads=int(os.environ.get("IBELT_EMBEDDER_THREADS", 0)) or None,
+                    backend=os.environ.get("IBELT_LOCAL_BACKEND", "torch"))
+            else:
+                # O gateway já repete chamadas com erro transitório
+                embedder = OpenAIEmbedder(llm.get_client(), max_retries=0)
+            cache = QueryEmbeddingCache(os.path.join(CACHE_DIR, "query_embeddings.sqlite"))
+            _embedder = CachedEmbedder(embedder, cache)
+        return _embedder
@@ -0,0 +1,63 @@
+# Exemplo de perguntas e respostas fictícias
+FAQ_DATA = [
+    ("Como posso redefinir minha senha?",
+     "Você pode redefinir sua senha clicando em 'Esqueci minha senha' na página de login."),
+    ("Quais são os métodos de pagamento aceitos?",
+     "Aceitamos cartões de crédito, PayPal e transferências bancárias."),
+    ("Como posso entrar em contato com o suporte?",
+     "Você pode entrar em contato com o suporte via e-mail ou chat ao vivo em nosso site."),
+    ("Existe um aplicativo móvel disponível?",
+     "Sim, nosso aplicativo móvel está disponível para iOS e Android."),
+    ("Como faço para cancelar minha assinatura?",
+     "Para cancelar sua assinatura, vá até 'Configurações' e clique em 'Cancelar assinatura'."),
+    ("Quais são os benefícios de usar a plataforma?",
+     "A plataforma oferece suporte especializado, simplificação de processos e maximização de incentivos fiscais para inovação."),
+    ("Como a plataforma garante a segurança dos meus dados?",
+     "Utilizamos criptografia avançada e seguimos rigorosos padrões de segurança para proteger seus dados."),
+    ("A plataforma é compatível com quais navegadores?",
+     "Nossa plataforma é compatível com os navegadores mais populares, incluindo Chrome, Firefox, Safari e Edge."),
+    ("É possível integrar a plataforma com outros softwares?",
+     "Sim, oferecemos integrações com diversos softwares de contabilidade e gestão de projetos."),
+    ("Há um período de teste gratuito disponível?",
+     "Sim, oferecemos um período de teste gratuito de 14 dias para novos usuários."),
+    ("Quais tipos de projetos são elegíveis para incentivos fiscais?",
+     "Projetos que envolvem pesquisa, desenvolvimento e inovação tecnológica são geralmente elegíveis."),
+    ("A plataforma oferece suporte para empresas de todos os tamanhos?",
+     "Sim, nossa plataforma é projetada para atender empresas de todos os tamanhos, desde startups até grandes corporações."),
+    ("Como posso atualizar minhas informações de pagamento?",
+     "Você pode atualizar suas informações de pagamento na seção 'Faturamento' do seu perfil."),
+    ("Existe algum treinamento disponível para novos usuários?",
+     "Sim, oferecemos webinars e tutoriais para ajudar novos usuários a se familiarizarem com a plataforma."),
+    ("Como posso acompanhar o status do meu pedido de incentivo?",
+     "Você pode acompanhar o status do seu pedido na seção 'Meus Pedidos' do seu painel de controle."),
+    ("A plataforma está disponível em quais idiomas?",
+     "Atualmente, nossa plataforma está disponível em português, inglês e espanhol."),
+    ("Como posso adicionar novos membros da equipe à minha conta?",
+     "Você pode adicionar novos membros da equipe na seção 'Equipe' do seu perfil."),
+    ("Qual é o custo da assinatura mensal?",
+     "Os preços variam de acordo com o plano escolhido. Consulte nossa página de preços para mais detalhes."),
+    ("A plataforma oferece suporte em tempo real?",
+     "Sim, oferecemos suporte em tempo real via chat durante o horário comercial."),
+    ("Como posso enviar feedback sobre a plataforma?",
+     "Você pode enviar seu feedback através do formulário de contato disponível em nosso site."),
+    ("A plataforma ajuda a identificar oportunidades de incentivos fiscais?",
+     "Sim, nossa plataforma possui ferramentas que ajudam a identificar e maximizar oportunidades de incentivos fiscais."),
+    ("Quais são os requisitos para se qualificar para incentivos fiscais?",
+     "Os requisitos podem variar, mas geralmente incluem a realização de atividades de P&D e inovação."),
+    ("Como posso acessar relatórios de desempenho dos meus projetos?",
+     "Relatórios de desempenho estão disponíveis na seção 'Relatórios' do seu painel de controle."),
+    ("Existe algum custo adicional além da assinatura?",
+     "Não, todos os custos estão incluídos na assinatura, a menos que você opte por serviços adicionais."),
+    ("A plataforma oferece suporte para preenchimento de formulários de incentivo?",
+     "Sim, nossa equipe pode ajudar no preenchimento e submissão de formulários de incentivo."),
+    ("Como posso alterar meu plano de assinatura?",
+     "Você pode alterar seu plano de assinatura na seção 'Plano' do seu perfil."),
+    ("Os dados inseridos na plataforma são compartilhados com terceiros?",
+     "Não, seus dados são confidenciais e não são compartilhados com terceiros sem seu consentimento."),
+    ("A plataforma oferece alguma garantia de sucesso na obtenção de incentivos?",
+     "Embora ofereçamos suporte e ferramentas para maximizar suas chances, não podemos garantir o sucesso devido a fatores externos."),
+    ("Como posso participar de webinars e eventos da plataforma?",
+     "Você pode se inscrever em webinars e eventos através da seção 'Eventos' do nosso site."),
+    ("A plataforma oferece alguma certificação para usuários?",
+     "Sim, oferecemos certificações após a conclusão de determinados treinamentos e cursos oferecidos pela plataforma.")
+]
@@ -0,0 +1,304 @@
+import asyncio
+import json
+import os
+import queue
+import random
+import threading
+from types import SimpleNamespace
+
+import httpx
+import openai
+from openai import AsyncOpenAI
+
+from ibelt.scheduler import (PRIORITY_INTERACTIVE, RateLimiter, estimate_chat_tokens,
+                             estimate_embedding_tokens)
+
+# Erros transitórios que valem nova tentativa
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError,
+                    openai.InternalServerError)
+
+_DONE = object()
+
+
+def _retry_after(error):
+    """Delay in seconds requested by a 429 response, or None."""
+    headers = error.response.headers
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1e3
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+
+class LLMGateway:
+    """Single entry point for OpenAI calls, shared by every session in the process.
+
+    One `AsyncOpenAI` client runs on a dedicated event loop thread over a
+    pooled httpx transport, so connections (and their TLS sessions) are kept
+    alive and reused across sessions. A semaphore bounds in-flight requests,
+    and transient failures are retried with exponential backoff and jitter.
+
+    Calls pass through a per-model `RateLimiter` that keeps them within the
+    organisation's RPM/TPM budget; callers may add `priority=` (see
+    `ibelt.scheduler`) so user-facing replies are admitted before
+    background work. Identical embedding requests in flight at the same
+    time share one upstream call. Synchronous callers (Streamlit scripts, worker threads) use `run` and
+    `iterate`, or the OpenAI-shaped facade from `SyncClient`.
+
+    Args:
+        api_key (str): defaults to `OPENAI_API_KEY`
+        base_url (str): defaults to `OPENAI_BASE_URL` or the public API
+        max_connections (int): connection pool size
+        max_keepalive (int): idle connections kept open (default: `max_connections`)
+        keepalive_expiry (float): seconds an idle connection is kept
+        max_concurrency (int): requests in flight at once; extra calls wait
+        timeout (httpx.Timeout): per-request timeouts
+        max_retries (int): attempts after the first for transient errors
+        base_delay (float): first backoff delay in seconds
+        max_delay (float): backoff cap in seconds
+        limits (dict): model -> (rpm, tpm); models not listed are not throttled
+            locally, but still back off on 429
+    """
+
+    def __init__(self, api_key=None, base_url=None, max_connections=100, max_keepalive=None,
+                 keepalive_expiry=30.0, max_concurrency=64, timeout=None, max_retries=4,
+                 base_delay=0.5, max_delay=20.0, limits=None):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.limits = dict(limits or {})
+        self.retries = 0
+        self.rate_limited = 0
+        self.coalesced = 0
+        self._limiters = {}
+        self._inflight_embeddings = {}
+        self._closed = False
+        self._closing = threading.Lock()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="ibelt-gateway", daemon=True)
+        self._thread.start()
+
+        async def setup():
+            # O cliente httpx e o semáforo pertencem ao loop do gateway
+            self._semaphore = asyncio.Semaphore(max_concurrency)
+            self._http = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=max_connections,
+                                    max_keepalive_connections=max_keepalive or max_connections,
+                                    keepalive_expiry=keepalive_expiry),
+                timeout=timeout or httpx.Timeout(60.0, connect=5.0))
+            self.client = AsyncOpenAI(api_key=api_key or os.environ.get("OPENAI_API_KEY"),
+                                      base_url=base_url, http_client=self._http, max_retries=0)
+
+        self.run(setup())
+
+    def _submit(self, coroutine):
+        # Sob o lock, nada entra no loop depois que `close` começou a cancelar as chamadas
+        with self._closing:
+            if self._closed:
+                coroutine.close()
+                raise RuntimeError("O gateway LLM foi fechado.")
+            return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    def run(self, coroutine):
+        """Runs `coroutine` on the gateway loop and blocks until it returns.
+
+        Raises RuntimeError if the gateway is closed, and CancelledError if
+        it is closed while the call is in flight.
+        """
+        return self._submit(coroutine).result()
+
+    def iterate(self, make_iterator):
+        """Consumes the async iterator built by `make_iterator` from synchronous code.
+
+        Items are handed over through a queue as they arrive; closing the
+        returned generator early cancels the underlying request.
+        """
+        items = queue.Queue()
+
+        async def pump():
+            try:
+                async for item in make_iterator():
+                    items.put(item)
+            except Exception as e:
+                items.put(e)
+            except asyncio.CancelledError:
+                # Fechamento do gateway no meio do stream: o consumidor recebe erro, não um texto cortado
+                items.put(RuntimeError("O gateway LLM foi fechado durante a resposta."))
+                raise
+            finally:
+                items.put(_DONE)
+
+        future = self._submit(pump())
+        try:
+            while (item := items.get()) is not _DONE:
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            future.cancel()
+
+    def _backoff(self, attempt):
+        return min(self.max_delay, self.base_delay * 2 ** attempt) * (0.5 + random.random())
+
+    def limiter(self, model):
+        if model not in self._limiters:
+            self._limiters[model] = RateLimiter(*self.limits.get(model, (None, None)))
+        return self._limiters[model]
+
+    async def _call(self, request, model, tokens, priority, keep_slot=False):
+        """Sends `request()` once admitted by the model's limiter, retrying transient errors.
+
+        With `keep_slot` the concurrency slot stays taken on success and the
+        caller must release it (streams hold it until fully read).
+        """
+        limiter = self.limiter(model)
+        for attempt in range(self.max_retries + 1):
+            await limiter.acquire(tokens, priority)
+            await self._semaphore.acquire()
+            try:
+                result = await request()
+            except RETRYABLE_ERRORS as e:
+                self._semaphore.release()
+                if attempt == self.max_retries:
+                    raise
+                self.retries += 1
+                delay = self._backoff(attempt)
+                if isinstance(e, openai.RateLimitError):
+                    # O limite é da organização: todas as chamadas deste modelo esperam
+                    self.rate_limited += 1
+                    limiter.pause(_retry_after(e) or delay)
+                else:
+                    await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                self._semaphore.release()
+                raise
+            if not keep_slot:
+                self._semaphore.release()
+            return result
+
+    def _settle(self, model, estimated, response):
+        usage = getattr(response, "usage", None)
+        if usage is not None and usage.total_tokens:
+            self.limiter(model).settle(estimated, usage.total_tokens)
+
+    async def chat(self, priority=PRIORITY_INTERACTIVE, **kwargs):
+        tokens = estimate_chat_tokens(kwargs)
+        response = await self._call(lambda: self.client.chat.completions.create(**kwargs),
+                                    kwargs["model"], tokens, priority)
+        self._settle(kwargs["model"], tokens, response)
+        return response
+
+    async def chat_stream(self, priority=PRIORITY_INTERACTIVE, **kwargs):
+        """Yields `ChatCompletionChunk`s; only opening the stream is retried."""
+        tokens = estimate_chat_tokens(kwargs)
+        stream = await self._call(lambda: self.client.chat.completions.create(stream=True, **kwargs),
+                                  kwargs["model"], tokens, priority, keep_slot=True)
+        try:
+            async with stream:
+                async for chunk in stream:
+                    # Só vem uso no stream com stream_options={"include_usage": True}
+                    self._settle(kwargs["model"], tokens, chunk)
+                    yield chunk
+        finally:
+            self._semaphore.release()
+
+    async def parse(self, priority=PRIORITY_INTERACTIVE, **kwargs):
+        tokens = estimate_chat_tokens(kwargs)
+        response = await self._call(lambda: self.client.beta.chat.completions.parse(**kwargs),
+                                    kwargs["model"], tokens, priority)
+        self._settle(kwargs["model"], tokens, response)
+        return response
+
+    async def embeddings(self, priority=PRIORITY_INTERACTIVE, **kwargs):
+        """Embeds; an identical request already in flight is awaited instead of resent."""
+        key = json.dumps(kwargs, sort_keys=True, ensure_ascii=False)
+        task = self._inflight_embeddings.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(self._embeddings(priority, kwargs))
+            self._inflight_embeddings[key] = task
+            task.add_done_callback(lambda _: self._inflight_embeddings.pop(key, None))
+        # shield: um chamador cancelado não cancela a chamada dos demais
+        return await asyncio.shield(task)
+
+    async def _embeddings(self, priority, kwargs):
+        tokens = estimate_embedding_tokens(kwargs)
+        response = await self._call(lambda: self.client.embeddings.create(**kwargs),
+                                    kwargs["model"], tokens, priority)
+        self._settle(kwargs["model"], tokens, response)
+        return response
+
+    def stats(self):
+        return {
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "coalesced": self.coalesced,
+            "limiters": {model: limiter.stats() for model, limiter in self._limiters.items()},
+        }
+
+    def close(self):
+        """Cancels the calls in flight, closes the connections and stops the loop.
+
+        Callers waiting on a cancelled call get an error instead of blocking;
+        later calls raise RuntimeError.
+        """
+        with self._closing:
+            if self._closed:
+                return
+            self._closed = True
+
+        async def shutdown():
+            pending = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            await self._http.aclose()
+
+        asyncio.run_coroutine_threadsafe(shutdown(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+
+class _Completions:
+    def __init__(self, get_gateway):
+        self._get_gateway = get_gateway
+
+    def create(self, stream=False, **kwargs):
+        gateway = self._get_gateway()
+        if stream:
+            return gateway.iterate(lambda: gateway.chat_stream(**kwargs))
+        return gateway.run(gateway.chat(**kwargs))
+
+    def parse(self, **kwargs):
+        gateway = self._get_gateway()
+        return gateway.run(gateway.parse(**kwargs))
+
+
+class _Embeddings:
+    def __init__(self, get_gateway):
+        self._get_gateway = get_gateway
+
+    def create(self, **kwargs):
+        gateway = self._get_gateway()
+        return gateway.run(gateway.embeddings(**kwargs))
+
+
+class SyncClient:
+    """Blocking facade with the `OpenAI` client's method paths, backed by a gateway.
+
+    Supports `chat.completions.create` (streamed responses are iterators of
+    chunks), `beta.chat.completions.parse` and `embeddings.create`. The
+    gateway is looked up on every call, so the facade survives a fork and
+    `llm.close_gateway` (the next call goes to the new gateway).
+    """
+
+    def __init__(self, get_gateway):
+        completions = _Completions(get_gateway)
+        self.chat = SimpleNamespace(completions=completions)
+        self.beta = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+        self.embeddings = _Embeddings(get_gateway)
@@ -0,0 +1,176 @@
+import math
+import os
+
+import faiss
+import numpy as np
+
+DEFAULT_PARAMS = {
+    "flat": {},
+    "flat_ip": {},
+    "hnsw": {"m": 32, "ef_construction": 200, "ef_search": 64},
+    "ivf_flat": {"nlist": None, "nprobe": 8},
+    "ivf_pq": {"nlist": None, "nprobe": 16, "pq_m": None, "nbits": 8},
+    # Armazenamento compacto sem particionamento: busca exaustiva sobre códigos
+    "flat_fp16": {},
+    "flat_sq8": {},
+    "pq": {"pq_m": None, "nbits": 8},
+}
+
+# Carrega índices via mmap (somente leitura), compartilhando as páginas entre processos
+MMAP_ENABLED = os.environ.get("IBELT_INDEX_MMAP", "0") == "1"
+
+# Pontos de treino por lista invertida recomendados pelo FAISS
+TRAIN_POINTS_PER_LIST = 39
+
+
+def resolve_params(name, n_vectors, dimension, **overrides):
+    """Fills backend defaults and derives size-dependent parameters.
+
+    `nlist` defaults to about 4 * sqrt(n), capped so every list gets enough
+    training points; `pq_m` defaults to the largest divisor of the dimension
+    giving at least 4 dimensions per sub-quantizer, up to 64 sub-quantizers.
+    """
+    if name not in DEFAULT_PARAMS:
+        raise ValueError(f"Backend de índice desconhecido: {name}. Opções: {', '.join(DEFAULT_PARAMS)}")
+    params = {**DEFAULT_PARAMS[name], **{k: v for k, v in overrides.items() if v is not None}}
+    if "nlist" in params and params["nlist"] is None:
+        params["nlist"] = max(1, min(int(4 * math.sqrt(n_vectors)), n_vectors // TRAIN_POINTS_PER_LIST))
+    if "pq_m" in params and params["pq_m"] is None:
+        params["pq_m"] = max(m for m in range(1, max(1, min(64, dimension // 4)) + 1) if dimension % m == 0)
+    if name in ("ivf_pq", "pq") and n_vectors < TRAIN_POINTS_PER_LIST * 2 ** params["nbits"]:
+        # Cada sub-quantizador do PQ treina 2^nbits centróides
+        params["nbits"] = max(1, int(math.log2(max(n_vectors // TRAIN_POINTS_PER_LIST, 2))))
+    return params
+
+
+def create_index(name, dimension, params):
+    """Creates an empty index for backend `name` that accepts `add_with_ids`.
+
+    IVF indexes store IDs natively; the others are wrapped in an `IndexIDMap`
+    (IVF must not be, since removals there do not renumber rows).
+    """
+    if name == "flat":
+        inner = faiss.IndexFlatL2(dimension)
+    elif name == "flat_ip":
+        inner = faiss.IndexFlatIP(dimension)
+    elif name == "hnsw":
+        inner = faiss.IndexHNSWFlat(dimension, params["m"])
+        inner.hnsw.efConstruction = params["ef_construction"]
+    elif name == "ivf_flat":
+        inner = faiss.IndexIVFFlat(faiss.IndexFlatL2(dimension), dimension, params["nlist"])
+    elif name == "ivf_pq":
+        inner = faiss.IndexIVFPQ(faiss.IndexFlatL2(dimension), dimension, params["nlist"],
+                                 params["pq_m"], params["nbits"])
+    elif name == "flat_fp16":
+        inner = faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_fp16)
+    elif name == "flat_sq8":
+        inner = faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_8bit)
+    elif name == "pq":
+        inner = faiss.IndexPQ(dimension, params["pq_m"], params["nbits"])
+    else:
+        raise ValueError(f"Backend de índice desconhecido: {name}")
+    index = inner if name.startswith("ivf") else faiss.IndexIDMap(inner)
+    apply_search_params(index, name, params)
+    return index
+
+
+def apply_search_params(index, name, params):
+    """Sets query-time knobs (nprobe, efSearch) on a freshly created or loaded index."""
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else faiss.downcast_index(index)
+    if name == "hnsw":
+        inner.hnsw.efSearch = params["ef_search"]
+    elif name in ("ivf_flat", "ivf_pq"):
+        inner.nprobe = params["nprobe"]
+
+
+def read_index(path, mmap=False):
+    """Reads an index, optionally memory-mapped and read-only.
+
+    With `mmap=True` the vector codes stay in the OS page cache, shared by
+    every process that maps the same file, instead of being copied into
+    each worker's heap.
+    """
+    if not mmap:
+        return faiss.read_index(path)
+    flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+    # IO_FLAG_MMAP_IFC mapeia os códigos de índices flat/SQ/PQ; só existe em versões recentes do
+    # FAISS, e os leitores que não o suportam (IVF) falham com ele: lê de novo só com IO_FLAG_MMAP
+    mmap_ifc = getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+    if mmap_ifc:
+        try:
+            return faiss.read_index(path, flags | mmap_ifc)
+        except RuntimeError:
+            pass
+    return faiss.read_index(path, flags)
+
+
+def normalizes(name):
+    """Inner-product backends store unit vectors so scores are cosine similarities."""
+    return name == "flat_ip"
+
+
+def supports_remove(name):
+    return name != "hnsw"
+
+
+def prepare(name, vectors):
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    if normalizes(name):
+        vectors = vectors.copy()
+        faiss.normalize_L2(vectors)
+    return vectors
+
+
+def train(index, vectors, max_points=100_000, seed=0):
+    """Trains `index` on a random sample of `vectors` if it needs training."""
+    if index.is_trained:
+        return
+    if len(vectors) > max_points:
+        rows = np.random.default_rng(seed).choice(len(vectors), max_points, replace=False)
+        vectors = vectors[np.sort(rows)]
+    index.train(vectors)
+
+
+def vector_ids(index):
+    """Returns the IDs stored in `index`, in row order for `IndexIDMap`."""
+    if isinstance(index, faiss.IndexIDMap):
+        return faiss.vector_to_array(index.id_map)
+    ivf = faiss.extract_index_ivf(index)
+    invlists = ivf.invlists
+    return np.concatenate([np.array(faiss.rev_swig_ptr(invlists.get_ids(i), invlists.list_size(i)))
+                           for i in range(ivf.nlist)] or [np.empty(0, dtype="int64")])
+
+
+def make_reconstructor(index):
+    """Returns a function mapping vector IDs to their stored vectors.
+
+    For PQ indexes the vectors are the decoded (approximate) codes.
+    """
+    if isinstance(index, faiss.IndexIDMap):
+        rows = {int(i): row for row, i in enumerate(vector_ids(index))}
+        inner = faiss.downcast_index(index.index)
+        return lambda ids: np.vstack([inner.reconstruct(rows[int(i)]) for i in ids])
+    ivf = faiss.extract_index_ivf(index)
+    ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+    return lambda ids: np.vstack([ivf.reconstruct(int(i)) for i in ids])
+
+
+def to_l2_distances(index, scores):
+    """Converts inner-product scores on unit vectors to squared L2 distances."""
+    if index.metric_type == faiss.METRIC_INNER_PRODUCT:
+        return np.maximum(2.0 - 2.0 * scores, 0.0)
+    return scores
+
+
+def build(name, vectors, ids, **overrides):
+    """Creates, trains and fills an index for backend `name`.
+
+    Returns:
+        tuple: (index, resolved params)
+    """
+    vectors = prepare(name, vectors)
+    params = resolve_params(name, len(vectors), vectors.shape[1], **overrides)
+    index = create_index(name, vectors.shape[1], params)
+    train(index, vectors)
+    index.add_with_ids(vectors, np.asarray(ids, dtype="int64"))
+    return index, params
@@ -0,0 +1,150 @@
+import hashlib
+import json
+import os
+import re
+
+import faiss
+import numpy as np
+
+from ibelt import index_backends, llm
+
+DEFAULT_BACKEND = os.environ.get("IBELT_INDEX_BACKEND", "flat")
+# Manifestos anteriores aos backends configuráveis sempre usaram IndexFlatL2
+LEGACY_BACKEND = {"name": "flat", "params": {}}
+
+
+def model_index_path(index_path, model):
+    """Index file for `model`, so vectors from different embedders never mix.
+
+    The default OpenAI model keeps `index_path` unchanged; any other model
+    gets its name as a suffix (`indice_faiss.local_<model>.index`).
+    """
+    if model == llm.EMBEDDING_MODEL:
+        return index_path
+    root, ext = os.path.splitext(index_path)
+    return f"{root}.{re.sub(r'[^A-Za-z0-9.-]+', '_', model)}{ext}"
+
+
+def manifest_path(index_path):
+    return index_path + ".manifest.json"
+
+
+def content_hash(question):
+    """Content address of a FAQ question; only the question text is embedded."""
+    normalized = " ".join(question.replace("\n", " ").split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def load_manifest(index_path):
+    path = manifest_path(index_path)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_atomic(path, write):
+    tmp_path = path + ".tmp"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def save_index(index, manifest, index_path):
+    # O manifesto é gravado por último: um índice sem manifesto válido é reconstruído
+    _write_atomic(index_path, lambda p: faiss.write_index(index, p))
+    _write_atomic(manifest_path(index_path), lambda p: _dump_json(manifest, p))
+
+
+def _dump_json(data, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=1)
+
+
+def id_positions(manifest, faq_data):
+    """Maps stable vector IDs to positions in `faq_data`."""
+    positions = {content_hash(pergunta): i for i, (pergunta, _) in enumerate(faq_data)}
+    return {int(vector_id): positions[h]
+            for vector_id, h in manifest["entries"].items() if h in positions}
+
+
+def sync_index(faq_data, embed, model, index_path, backend=None, backend_params=None):
+    """Brings the on-disk index in line with `faq_data`, embedding only the delta.
+
+    Vectors are stored in an `IndexIDMap` under stable IDs recorded in a
+    sidecar manifest together with each question's content hash, the
+    embedding model, the dimension and the index backend with its resolved
+    parameters. Entries whose hash is unchanged keep their vector; removed
+    or edited questions are dropped with `remove_ids`. A missing or
+    incompatible manifest (different model or backend) triggers a full
+    rebuild, which trains the backend on a sample of the vectors.
+
+    Args:
+        faq_data (list): (question, answer) tuples
+        embed (callable): list of texts -> float32 matrix of embeddings
+        model (str): embedding model name
+        index_path (str): index file on disk
+        backend (str): name from `index_backends.DEFAULT_PARAMS` (default
+            `IBELT_INDEX_BACKEND` or "flat")
+        backend_params (dict): overrides for the backend parameters
+
+    Returns:
+        tuple: (added, removed) number of vectors
+    """
+    if not faq_data:
+        raise ValueError("faq_data está vazio, nada para indexar.")
+    backend = backend or DEFAULT_BACKEND
+    manifest = load_manifest(index_path)
+    index = None
+    if (manifest is not None and manifest.get("model") == model
+            and manifest.get("backend", LEGACY_BACKEND)["name"] == backend
+            and os.path.exists(index_path)):
+        index = faiss.read_index(index_path)
+        if index.d != manifest.get("dimension") or index.ntotal != len(manifest["entries"]):
+            index = None
+    if index is None:
+        manifest = {"model": model, "dimension": None, "backend": {"name": backend, "params": {}},
+                    "next_id": 0, "entries": {}}
+    manifest.setdefault("backend", LEGACY_BACKEND)
+
+    wanted = {}
+    for pergunta, _ in faq_data:
+        wanted.setdefault(content_hash(pergunta), pergunta)
+    known = {h: int(vector_id) for vector_id, h in manifest["entries"].items()}
+
+    stale_ids = [vector_id for h, vector_id in known.items() if h not in wanted]
+    new_hashes = [h for h in wanted if h not in known]
+    if index is not None and not stale_ids and not new_hashes:
+        return 0, 0
+
+    if new_hashes:
+        embeddings = embed([wanted[h] for h in new_hashes])
+        ids = np.arange(manifest["next_id"], manifest["next_id"] + len(new_hashes), dtype="int64")
+        if index is None:
+            index, params = index_backends.build(backend, embeddings, ids, **(backend_params or {}))
+            manifest["dimension"] = index.d
+            manifest["backend"]["params"] = params
+        else:
+            index.add_with_ids(index_backends.prepare(backend, embeddings), ids)
+        manifest["next_id"] += len(new_hashes)
+        manifest["entries"].update({str(vector_id): h for vector_id, h in zip(ids.tolist(), new_hashes)})
+    if stale_ids:
+        if index_backends.supports_remove(backend):
+            index.remove_ids(np.array(stale_ids, dtype="int64"))
+        else:
+            index = _rebuild_without(index, manifest["backend"], stale_ids)
+        for vector_id in stale_ids:
+            del manifest["entries"][str(vector_id)]
+
+    save_index(index, manifest, index_path)
+    print(f"Índice FAISS sincronizado: {len(new_hashes)} adicionados, {len(stale_ids)} removidos.")
+    return len(new_hashes), len(stale_ids)
+
+
+def _rebuild_without(index, backend, stale_ids):
+    # Backends sem remove_ids (HNSW) são reconstruídos a partir dos vetores armazenados
+    ids = index_backends.vector_ids(index)
+    vectors = faiss.downcast_index(index.index).reconstruct_n(0, index.ntotal)
+    keep = ~np.isin(ids, stale_ids)
+    rebuilt = index_backends.create_index(backend["name"], index.d, backend["params"])
+    rebuilt.add_with_ids(vectors[keep], ids[keep])
+    return rebuilt
@@ -0,0 +1,87 @@
+from typing import List, Literal, Optional
+
+from pydantic import BaseModel, Field
+
+from ibelt import tracing
+from ibelt.scheduler import PRIORITY_BACKGROUND
+
+EXTRACTION_MODEL = "gpt-4o-mini"
+
+EXTRACTION_PROMPT = """
+Você extrai dados de qualificação de lead de UMA troca de mensagens entre o agente comercial e o usuário.
+- Preencha apenas os campos que a nova resposta do usuário informa ou corrige.
+- Deixe todos os outros campos como null; não invente nem repita informações não ditas nesta resposta.
+"""
+
+
+class LeadRecord(BaseModel):
+    """Qualification data collected by the Agente Comercial.
+
+    Every field is optional; the same model describes both the accumulated
+    record and the per-turn delta returned by the extraction call.
+    """
+    nome: Optional[str] = Field(None, description="Nome do usuário")
+    empresa: Optional[str] = Field(None, description="Nome da empresa")
+    setor: Optional[str] = Field(None, description="Setor de atuação")
+    tamanho_empresa: Optional[str] = Field(None, description="Porte ou número de funcionários")
+    natureza_juridica: Optional[Literal["empresa", "mei", "ong", "pessoa_fisica"]] = None
+    tipo_empresa: Optional[Literal["industrial", "comercial", "servicos"]] = None
+    regime_tributario: Optional[str] = Field(None, description="Ex.: lucro real, lucro presumido, simples")
+    necessidades: Optional[List[str]] = Field(None, description="Necessidades ou desafios citados")
+    possui_tecnicos_em_projetos: Optional[bool] = None
+    numero_tecnicos: Optional[int] = Field(None, description="Quantidade aproximada de técnicos")
+    pessoas_envolvidas: Optional[int] = Field(None, description="Pessoas que trabalham total ou parcialmente nas mudanças")
+    tipo_projetos: Optional[Literal["produtos_novos", "produtos_modificados", "ambos"]] = None
+    projetos_de_processo: Optional[bool] = None
+    desenvolvimento_interno: Optional[bool] = None
+    possui_parceiros: Optional[bool] = None
+    numero_projetos: Optional[int] = Field(None, description="Projetos de inovação ou mudanças técnicas em andamento")
+    descricao_trabalhos: Optional[str] = Field(None, description="Tipo de renovação de produto ou serviço realizada")
+    incentivo_buscado: Optional[str] = Field(None, description="Área da lei de incentivo buscada, se citada")
+
+    def merge(self, delta):
+        """Returns a new record with the non-null fields of `delta` applied.
+
+        Scalar fields are overwritten; `necessidades` accumulates without duplicates.
+        """
+        update = delta.model_dump(exclude_none=True)
+        if "necessidades" in update:
+            anteriores = self.necessidades or []
+            update["necessidades"] = anteriores + [n for n in update["necessidades"] if n not in anteriores]
+        return self.model_copy(update=update)
+
+    def to_prompt(self):
+        return self.model_dump_json(exclude_none=True)
+
+
+def extract_lead_delta(client, question, answer, model=EXTRACTION_MODEL):
+    """Asks the model for the fields learned from a single question/answer pair.
+
+    The request contains only this turn, so its size does not grow with the
+    conversation; the response is parsed against `LeadRecord` via
+    structured outputs.
+
+    Args:
+        client (SyncClient): gateway client, see `ibelt.llm.get_client`
+        question (str): last message from the agent
+        answer (str): user's reply
+
+    Returns:
+        LeadRecord: delta with only the newly learned fields set
+    """
+    with tracing.span("lead.extract", **{"gen_ai.request.model": model}) as span:
+        resposta = client.beta.chat.completions.parse(
+            model=model,
+            messages=[
+                {"role": "system", "content": EXTRACTION_PROMPT},
+                {"role": "user", "content": f"Pergunta do agente: {question}\nResposta do usuário: {answer}"},
+            ],
+            response_format=LeadRecord,
+            # Roda em segundo plano: cede a vez às respostas que o usuário está esperando
+            priority=PRIORITY_BACKGROUND,
+        )
+        if resposta.usage is not None:
+            span.set(**{"gen_ai.usage.input_tokens": resposta.usage.prompt_tokens,
+                        "gen_ai.usage.output_tokens": resposta.usage.completion_tokens})
+    delta = resposta.choices[0].message.parsed
+    return delta if delta is not None else LeadRecord()
@@ -0,0 +1,118 @@
+import math
+import re
+import unicodedata
+from collections import Counter, defaultdict
+
+# Palavras funcionais e muletas de pergunta do português, já sem acentos
+STOPWORDS = frozenset("""
+a ao aos as ate com como da das de do dos e ela ele em entre essa esse esta este eu
+ha isso isto ja la lhe mais mas me meu minha na nas no nos o os ou para pela pelas pelo
+pelos por qual quais quando que se sem ser seu sua sao tem um uma umas uns voce voces
+pra pro posso consigo faco gostaria quero saber
+""".split())
+
+# "&" e "/" fazem parte de siglas como P&D e PD&I
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[&/][a-z0-9]+)*")
+
+
+def fold_accents(text):
+    return "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+
+
+def _singular(token):
+    # Redução leve de plural; não é um stemmer completo (ex.: RSLP)
+    if len(token) <= 3 or not token.endswith("s"):
+        return token
+    for suffix, replacement in (("oes", "ao"), ("aes", "ao"), ("ais", "al"), ("eis", "el"),
+                                ("ois", "ol"), ("ns", "m"), ("res", "r"), ("zes", "z")):
+        if token.endswith(suffix):
+            return token[:-len(suffix)] + replacement
+    return token[:-1]
+
+
+def tokenize(text):
+    """Lowercases, folds accents, drops stopwords and reduces plurals."""
+    tokens = TOKEN_PATTERN.findall(fold_accents(text.lower()))
+    return [_singular(t) for t in tokens if t not in STOPWORDS]
+
+
+class BM25Index:
+    """In-process Okapi BM25 inverted index over a fixed list of texts.
+
+    Built from the same FAQ questions as the FAISS index, so positions in
+    `texts` map to FAQ entries. Immutable after construction and safe to
+    share between threads.
+    """
+
+    def __init__(self, texts, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.documents = [Counter(tokenize(text)) for text in texts]
+        self.lengths = [sum(doc.values()) for doc in self.documents]
+        self.average_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+        self.postings = defaultdict(list)
+        for position, doc in enumerate(self.documents):
+            for term, frequency in doc.items():
+                self.postings[term].append((position, frequency))
+        n = len(self.documents)
+        self.idf = {term: math.log(1 + (n - len(p) + 0.5) / (len(p) + 0.5))
+                    for term, p in self.postings.items()}
+        # Termos fora do vocabulário pesam como os mais raros na cobertura da consulta
+        self.unknown_idf = math.log(1 + (n + 0.5) / 0.5)
+
+    def __len__(self):
+        return len(self.documents)
+
+    def scores(self, query):
+        """Returns {position: BM25 score} for documents sharing a term with `query`."""
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for position, frequency in self.postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[position] / self.average_length)
+                scores[position] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+        return scores
+
+    def search(self, query, k=10):
+        """Returns up to `k` (position, score) pairs, best first."""
+        scores = self.scores(query)
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:k]
+
+    def exact_match(self, query, min_coverage=0.9):
+        """Returns the position of a document matching `query` term for term, or None.
+
+        A match requires that the query and the document each cover at least
+        `min_coverage` of the other's IDF mass (ignoring word order, accents,
+        stopwords and plurals), and that the match is unique.
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return None
+        query_mass = sum(self.idf.get(t, self.unknown_idf) for t in terms)
+        matches = []
+        for position, _ in self.search(query, k=5):
+            doc_terms = set(self.documents[position])
+            shared = sum(self.idf[t] for t in terms & doc_terms)
+            doc_mass = sum(self.idf[t] for t in doc_terms)
+            if shared / query_mass >= min_coverage and shared / doc_mass >= min_coverage:
+                matches.append(position)
+        return matches[0] if len(matches) == 1 else None
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """Fuses ranked lists of keys with reciprocal rank fusion.
+
+    Args:
+        rankings (list): lists of keys, each best first
+        k (int): damping constant; 60 is the value from the original paper
+
+    Returns:
+        list: (key, fused score) pairs, best first
+    """
+    fused = defaultdict(float)
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            fused[key] += 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: -item[1])
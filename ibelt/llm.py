@@ -0,0 +1,94 @@
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from ibelt.gateway import LLMGateway, SyncClient
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def parse_limits(spec):
+    """Parses "model=rpm:tpm,..." (empty rpm or tpm = unlimited) into {model: (rpm, tpm)}."""
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        model, _, budget = item.partition("=")
+        rpm, _, tpm = budget.partition(":")
+        limits[model.strip()] = (int(rpm) if rpm else None, int(tpm) if tpm else None)
+    return limits
+
+
+def get_gateway():
+    """Returns the process-wide `LLMGateway`, created on first use.
+
+    Pool and concurrency limits come from `IBELT_LLM_MAX_CONNECTIONS` and
+    `IBELT_LLM_MAX_CONCURRENCY`, the organisation's per-model rate limits
+    from `IBELT_LLM_LIMITS` (e.g. "gpt-4o=500:30000,gpt-4o-mini=500:200000");
+    `OPENAI_BASE_URL` points it at another OpenAI-compatible server.
+    """
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = LLMGateway(
+                max_connections=int(os.environ.get("IBELT_LLM_MAX_CONNECTIONS", 100)),
+                max_concurrency=int(os.environ.get("IBELT_LLM_MAX_CONCURRENCY", 64)),
+                limits=parse_limits(os.environ.get("IBELT_LLM_LIMITS", "")))
+        return _gateway
+
+
+def close_gateway(gateway):
+    """Closes `gateway`; if it is the process-wide one, the next call opens a new one."""
+    global _gateway
+    with _gateway_lock:
+        if _gateway is gateway:
+            _gateway = None
+    gateway.close()
+
+
+def _reset_after_fork():
+    # O processo filho não herda a thread do loop; cria outro gateway sob demanda
+    global _gateway, _gateway_lock
+    _gateway, _gateway_lock = None, threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+_client = SyncClient(get_gateway)
+
+
+def get_client():
+    """Returns the process-wide OpenAI-style client.
+
+    Every call goes through the shared gateway, so all sessions reuse one
+    pool of keep-alive connections instead of building clients per rerun.
+    """
+    return _client
+
+
+def iter_content(stream, on_usage=None):
+    """Yields the text fragments of a streamed chat completion.
+
+    With `stream_options={"include_usage": True}` the last chunk carries the
+    token usage and no text; it is passed to `on_usage` if given.
+    """
+    for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+        if on_usage is not None and getattr(chunk, "usage", None) is not None:
+            on_usage(chunk.usage)
+
+
+# Trabalho em segundo plano (ex.: extração de lead) que não deve atrasar a resposta
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="ibelt-llm")
+
+
+def submit(fn, *args, **kwargs):
+    """Runs `fn` on the shared background pool and returns its Future.
+
+    `fn` runs in a copy of the caller's context, so its spans join the
+    caller's trace (see `ibelt.tracing`).
+    """
+    return _executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
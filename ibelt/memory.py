@@ -0,0 +1,163 @@
+import threading
+
+from ibelt import llm, tracing
+from ibelt.scheduler import PRIORITY_BACKGROUND
+from ibelt.tokens import count_tokens
+
+SUMMARY_MODEL = "gpt-4o-mini"
+
+SUMMARY_PROMPT = """
+Você mantém um resumo curto de uma conversa entre um usuário e um assistente.
+Atualize o resumo existente com as novas mensagens, preservando nomes, números e decisões.
+Responda apenas com o resumo atualizado, em português, em no máximo 150 palavras.
+"""
+
+# Custo aproximado de papel e separadores de cada mensagem no formato de chat
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# A última troca (pergunta e resposta) fica na janela mesmo acima do orçamento
+MIN_WINDOW_TURNS = 2
+
+
+class ConversationMemory:
+    """Bounded chat history: a token-budgeted window plus a rolling summary.
+
+    `messages()` returns the newest turns that fit in `budget_tokens`,
+    preceded by a summary of older turns. The summary is refreshed in the
+    background once `summary_batch` messages have left the window, instead
+    of on every turn, so most turns pay no extra LLM call.
+
+    When the window overflows it drops old turns in a block, down to half
+    the budget, rather than one turn at a time; the window start then stays
+    put for several turns, keeping the prompt prefix cacheable. The last
+    user/assistant exchange is always kept, even if it alone exceeds the budget.
+
+    With a `store` (see `ibelt.sessions`) every turn and the summary are
+    written through under `conversation_id`, and an existing conversation
+    is resumed: only the summary and the newest `restore_turns` turns after
+    it are loaded; older turns stay in the store.
+    """
+
+    def __init__(self, client, budget_tokens=2000, summary_batch=4, model="gpt-4o",
+                 summary_model=SUMMARY_MODEL, initial=None, store=None, conversation_id=None,
+                 restore_turns=40):
+        self.client = client
+        self.budget_tokens = budget_tokens
+        self.summary_batch = summary_batch
+        self.model = model
+        self.summary_model = summary_model
+        self.store = store
+        self.conversation_id = conversation_id
+        self.summary = ""
+        self.turns = []
+        self._turn_seqs = []
+        self._next_seq = 0
+        self._token_counts = []
+        self._summarized_upto = 0
+        self._summary_tokens = 0
+        self._window_from = 0
+        self._pending = None
+        self._lock = threading.Lock()
+        if store is not None and self._restore(restore_turns):
+            return
+        for message in initial or []:
+            self.append(message["role"], message["content"])
+
+    def _restore(self, restore_turns):
+        """Loads a stored conversation; returns False if there is none."""
+        recentes = self.store.load_turns(self.conversation_id, limit=restore_turns)
+        if not recentes:
+            return False
+        estado = self.store.get_state(self.conversation_id, "memory") or {}
+        self.summary = estado.get("summary", "")
+        if self.summary:
+            self._summary_tokens = count_tokens(self.summary, self.model) + MESSAGE_OVERHEAD_TOKENS
+        # Turnos já cobertos pelo resumo não voltam para a janela
+        resumidos_ate = estado.get("summarized_through", -1)
+        for turn in recentes:
+            if turn.seq > resumidos_ate:
+                self.turns.append({"role": turn.role, "content": turn.content})
+                self._turn_seqs.append(turn.seq)
+                self._token_counts.append(count_tokens(turn.content, self.model) + MESSAGE_OVERHEAD_TOKENS)
+        self._next_seq = recentes[-1].seq + 1
+        return True
+
+    def __len__(self):
+        return len(self.turns)
+
+    @property
+    def last_seq(self):
+        """Seq of the newest turn written through this memory (-1 if none)."""
+        return self._next_seq - 1
+
+    def append(self, role, content):
+        with self._lock:
+            seq, self._next_seq = self._next_seq, self._next_seq + 1
+            self.turns.append({"role": role, "content": content})
+            self._turn_seqs.append(seq)
+            self._token_counts.append(count_tokens(content, self.model) + MESSAGE_OVERHEAD_TOKENS)
+        if self.store is not None:
+            self.store.append_turn(self.conversation_id, seq, role, content)
+        self._maybe_refresh_summary()
+
+    def _window_start(self):
+        budget = self.budget_tokens - self._summary_tokens
+        if sum(self._token_counts[self._window_from:]) <= budget:
+            return self._window_from
+        budget //= 2
+        # Os turnos que saem só entram no resumo a cada `summary_batch`; sem este mínimo,
+        # um turno maior que o orçamento esvaziaria a janela e a troca anterior se perderia
+        start = max(self._window_from, len(self.turns) - MIN_WINDOW_TURNS)
+        budget -= sum(self._token_counts[start:])
+        while start > self._window_from and budget - self._token_counts[start - 1] >= 0:
+            start -= 1
+            budget -= self._token_counts[start]
+        self._window_from = start
+        return start
+
+    def messages(self):
+        """Returns the messages to send before the current user prompt."""
+        with self._lock:
+            window = self.turns[self._window_start():]
+            if not self.summary:
+                return list(window)
+            resumo = {"role": "system", "content": f"Resumo da conversa até aqui: {self.summary}"}
+            return [resumo] + window
+
+    def _maybe_refresh_summary(self):
+        with self._lock:
+            if self._pending is not None and not self._pending.done():
+                return
+            end = self._window_start()
+            if end - self._summarized_upto < self.summary_batch:
+                return
+            novas = self.turns[self._summarized_upto:end]
+            self._pending = llm.submit(self._refresh_summary, self.summary, novas, end)
+
+    def _refresh_summary(self, summary, novas, end):
+        conversa = "\n".join(f"{m['role']}: {m['content']}" for m in novas)
+        try:
+            with tracing.span("memory.summarize", **{"gen_ai.request.model": self.summary_model}) as span:
+                resposta = self.client.chat.completions.create(
+                    model=self.summary_model,
+                    priority=PRIORITY_BACKGROUND,
+                    messages=[
+                        {"role": "system", "content": SUMMARY_PROMPT},
+                        {"role": "user", "content": f"Resumo atual: {summary or '(vazio)'}\n\nNovas mensagens:\n{conversa}"},
+                    ],
+                )
+                if resposta.usage is not None:
+                    span.set(**{"gen_ai.usage.input_tokens": resposta.usage.prompt_tokens,
+                                "gen_ai.usage.output_tokens": resposta.usage.completion_tokens})
+            novo_resumo = resposta.choices[0].message.content.strip()
+        except Exception as e:
+            print(f"Erro ao resumir a conversa: {e}")
+            return
+        with self._lock:
+            self.summary = novo_resumo
+            self._summary_tokens = count_tokens(novo_resumo, self.model) + MESSAGE_OVERHEAD_TOKENS
+            self._summarized_upto = end
+            resumidos_ate = self._turn_seqs[end - 1]
+        if self.store is not None:
+            self.store.put_state(self.conversation_id, "memory",
+                                 {"summary": novo_resumo, "summarized_through": resumidos_ate})
@@ -0,0 +1,155 @@
+import textwrap
+import threading
+
+from ibelt import llm, tracing
+
+
+class PromptUsage:
+    """Running totals of input tokens served from the provider's prompt cache."""
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.completion_tokens = 0
+        self._lock = threading.Lock()
+
+    def record(self, usage, span=None):
+        """Adds `usage` to the totals and, if given, as token attributes of `span`."""
+        if usage is None:
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = (getattr(details, "cached_tokens", None) or 0) if details is not None else 0
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += usage.prompt_tokens
+            self.cached_tokens += cached
+            self.completion_tokens += usage.completion_tokens
+        if span is not None:
+            span.set(**{"gen_ai.usage.input_tokens": usage.prompt_tokens,
+                        "gen_ai.usage.cached_input_tokens": cached,
+                        "gen_ai.usage.output_tokens": usage.completion_tokens})
+
+    def stats(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "prompt_tokens": self.prompt_tokens,
+                "cached_tokens": self.cached_tokens,
+                "uncached_tokens": self.prompt_tokens - self.cached_tokens,
+                "completion_tokens": self.completion_tokens,
+                "cache_ratio": self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0,
+            }
+
+
+class PromptTemplate:
+    """Chat prompt laid out for provider-side prefix caching.
+
+    The system message is dedented and built once, when this module is
+    imported, so it is byte-identical on every call. Messages go from the
+    most to the least stable: system prompt, conversation history, and
+    last a single user message with the per-turn content (retrieved text,
+    lead data) followed by the question. A turn therefore only changes the
+    tail of the prompt, and the cached prefix keeps matching.
+
+    Args:
+        name (str): label used in usage accounting
+        system (str): static system prompt
+    """
+
+    def __init__(self, name, system):
+        self.name = name
+        self.system_message = {"role": "system", "content": textwrap.dedent(system).strip()}
+        self.usage = PromptUsage(name)
+
+    @staticmethod
+    def user_content(question, context=None):
+        """Renders the per-turn content as tagged blocks, then the question."""
+        blocos = [f"<{tag}>\n{texto}\n</{tag}>" for tag, texto in (context or {}).items()]
+        return "\n\n".join(blocos + [f"Usuário: {question}"])
+
+    def messages(self, history, question, context=None):
+        return [self.system_message, *history,
+                {"role": "user", "content": self.user_content(question, context)}]
+
+    def complete(self, client, model, history, question, context=None, stream=True):
+        """Sends the assembled prompt and yields the reply text.
+
+        Streams ask for the final usage chunk, so cached and uncached input
+        tokens are recorded for streamed and plain calls alike. The call is
+        traced as an "llm.chat" span with an "llm.ttft" child that ends at
+        the first text fragment.
+        """
+        messages = self.messages(history, question, context)
+        # Spans não viram o atual: o gerador é consumido por quem renderiza
+        span = tracing.start_span("llm.chat", prompt=self.name, stream=stream,
+                                  **{"gen_ai.request.model": model})
+        ttft = tracing.start_span("llm.ttft", parent=span)
+        try:
+            if stream:
+                resposta = client.chat.completions.create(
+                    model=model, messages=messages, stream=True, stream_options={"include_usage": True})
+                for parte in llm.iter_content(resposta, on_usage=lambda usage: self.usage.record(usage, span)):
+                    ttft.end()
+                    yield parte
+            else:
+                resposta = client.chat.completions.create(model=model, messages=messages)
+                ttft.end()
+                self.usage.record(resposta.usage, span)
+                yield resposta.choices[0].message.content
+        except Exception as e:
+            ttft.end(error=e)
+            span.end(error=e)
+            raise
+        finally:
+            ttft.end()
+            span.end()
+
+
+CONSULTOR = PromptTemplate("consultor", """
+    Você é um assistente útil. Responda a pergunta de acordo com o conteúdo relevante enviado entre as tags <CONTEUDO_RELEVANTE> e </CONTEUDO_RELEVANTE> na última mensagem.
+    Avalie o conteúdo relevante, caso não ache coerente com a última pergunta, diga 'Não tenho informações suficientes para responder essa pergunta.'
+    Responda apenas a última pergunta feita pelo usuário, ou seja, caso não faça sentido continuar o raciocínio da conversa, foque no último assunto abordado pelo usuário.
+    Responda a pergunta com base no conteúdo relevante, mas pode complementar a resposta e adicionar algo a mais para deixar mais completo.
+    Se comporte como um chatbot, irei enviar a pergunta do usuário e um conteúdo relevante para se basear, responda o que um atendente responderia.
+    Nunca diga o porquê você não sabe responder a pergunta, apenas responda com base no conteúdo relevante ou a frase 'Não tenho informações suficientes para responder essa pergunta.' e nada mais.
+    """)
+
+AGENTE_COMERCIAL = PromptTemplate("agente_comercial", """
+    Você é um chatbot Agente Comercial da Pieracciani, especializado em identificar potenciais clientes que se encaixam no perfil ideal para nossa equipe comercial.
+    Seu objetivo é interagir de forma amigável e eficiente com visitantes do site,
+    coletando informações relevantes para determinar se eles devem ser encaminhados para um atendimento humano mais aprofundado.
+    Ao conversar com os usuários, você deve:
+    #Coletar Informações:
+    - Pergunte sobre o nome e a empresa do usuário.
+    - Identifique o setor de atuação e o tamanho da empresa.
+    - Entenda as necessidades ou desafios que o usuário está enfrentando.
+    - É uma empresa industrial, comercial ou de seviços?
+    - A empresa está no regime fiscal de lucro real?
+    - A empresa possui técnicos trabalhando em projetos?
+    - Os projetos são de produtos novos ou parcialmente modificados?
+    - Projetos de processo?
+    - As atividades de desenvolvimento ou preparação das mudanças de produto e processo são feitas internamente?
+    - A empresa tem parceiros para ajudar nesses desenvolvimentos?
+    - Quantas pessoas na empresa trabalham totalmente ou parcialmente para essas mudanças?
+    - Uma quantidade aproximada desses técnicos poderia ser estimada?
+    - Quantos projetos de inovações ou mudanças técnicas aproximadamente estão sendo realizados?
+    - Nos passe uma ideia do tipo de trabalho de renovação de produto ou serviço que são efetuados.
+    #Qualificar o Lead:
+    Avalie se o setor, tamanho da empresa e necessidades do usuário estão alinhados com o perfil de cliente ideal da Pieracciani.
+    Utilize perguntas adicionais para clarificar qualquer dúvida sobre o potencial do lead.
+    #Encaminhar ou Agradecer:
+    Se o usuário se qualificar como um potencial cliente, informe que você irá encaminhar suas informações para a equipe comercial, que entrará em contato em breve.
+    Caso contrário, agradeça o interesse e forneça informações úteis ou sugestões para futuras interações.
+
+    # Quem não é um cliente ideal e já pode ser descartado?
+    - Empresas que são MEI, ONG ou pessoa física.
+    - Busca lei de incentivo para Arte, Esporte, Cultura, Social.
+
+    #Regras:
+    - Não forneça informações pessoais ou confidenciais.
+    - Não responda sobre preços, valores e investimentos nos nossos serviços, isso é um especialista que irá responder.
+    - Os dados já coletados do lead vêm entre as tags <LEAD_DATA> e </LEAD_DATA> na última mensagem; se a informação já está no LEAD_DATA, não pergunte novamente.
+    - Você não explica nada, apenas pergunta sobre o que o usuário está falando.
+    """)
@@ -0,0 +1,130 @@
+import os
+import threading
+import time
+
+
+class _Entry:
+    def __init__(self, value, close):
+        self.value = value
+        self.close = close
+        self.sessions = set()
+        self.idle_since = time.monotonic()
+
+
+class ResourceRegistry:
+    """Process-wide registry of shared resources keyed by (page, kind, key).
+
+    Pages acquire heavy objects (clients, embedders, indexes, models)
+    through the registry instead of a global cache, and every acquiring
+    session is counted as a reference. Releasing a session (on page switch
+    or when the session ends) only drops its references: a resource nobody
+    holds stays loaded, so the next visitor does not pay the cold start, and
+    is closed only by `evict_idle` or `clear`.
+
+    Args:
+        max_idle_seconds (float): unreferenced resources older than this are
+            closed on the next `acquire` (None = kept until `clear`)
+    """
+
+    def __init__(self, max_idle_seconds=None):
+        self.max_idle_seconds = max_idle_seconds
+        self._entries = {}
+        self._building = {}
+        self._lock = threading.Lock()
+        self.created = 0
+        self.evicted = 0
+
+    def acquire(self, session, page, kind, factory, key=None, close=None):
+        """Returns the resource for (page, kind, key), building it with `factory` once.
+
+        Args:
+            session (str): id of the acquiring session, counted as a reference
+            page (str): page that uses the resource
+            kind (str): resource type, e.g. "embedder" or "retriever"
+            factory (callable): builds the resource; called without arguments
+            key (hashable): distinguishes resources of the same kind on a page
+            close (callable): called with the resource when it is evicted
+        """
+        if self.max_idle_seconds is not None:
+            self.evict_idle(self.max_idle_seconds)
+        name = (page, kind, key)
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None:
+                entry.sessions.add(session)
+                return entry.value
+            building = self._building.setdefault(name, threading.Lock())
+        # Um lock por recurso: sessões simultâneas não carregam o mesmo recurso duas
+        # vezes, e a carga de um não bloqueia o acesso aos que já estão prontos
+        with building:
+            with self._lock:
+                entry = self._entries.get(name)
+            if entry is None:
+                entry = _Entry(factory(), close)
+                with self._lock:
+                    self._entries[name] = entry
+                    self._building.pop(name, None)
+                    self.created += 1
+        with self._lock:
+            entry.sessions.add(session)
+        return entry.value
+
+    def release(self, session, page=None):
+        """Drops the references `session` holds on `page` (all pages if None)."""
+        now = time.monotonic()
+        with self._lock:
+            for (entry_page, _, _), entry in self._entries.items():
+                if (page is None or entry_page == page) and session in entry.sessions:
+                    entry.sessions.discard(session)
+                    if not entry.sessions:
+                        entry.idle_since = now
+
+    def evict_idle(self, max_idle_seconds=0.0):
+        """Closes and forgets resources unreferenced for at least `max_idle_seconds`."""
+        now = time.monotonic()
+        with self._lock:
+            idle = [k for k, entry in self._entries.items()
+                    if not entry.sessions and now - entry.idle_since >= max_idle_seconds]
+            entries = [self._entries.pop(k) for k in idle]
+            self.evicted += len(entries)
+        for entry in entries:
+            if entry.close is not None:
+                entry.close(entry.value)
+        return len(entries)
+
+    def clear(self):
+        """Closes every resource, referenced or not."""
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+            self.evicted += len(entries)
+        for entry in entries:
+            if entry.close is not None:
+                entry.close(entry.value)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "resources": {f"{page}/{kind}" + (f"/{key}" if key is not None else ""): len(entry.sessions)
+                              for (page, kind, key), entry in self._entries.items()},
+                "created": self.created,
+                "evicted": self.evicted,
+            }
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """Returns the process-wide registry.
+
+    `IBELT_RESOURCE_MAX_IDLE_SECONDS` closes resources no session has used
+    for that long; by default they stay loaded for the life of the process.
+    """
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            max_idle = os.environ.get("IBELT_RESOURCE_MAX_IDLE_SECONDS")
+            _registry = ResourceRegistry(float(max_idle) if max_idle else None)
+        return _registry
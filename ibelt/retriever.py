@@ -0,0 +1,293 @@
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+import faiss
+import numpy as np
+
+from ibelt import index_backends, indexing, tracing
+from ibelt.lexical import BM25Index, reciprocal_rank_fusion
+
+INDEX_PATH = "indice_faiss.index"
+
+
+@dataclass(frozen=True)
+class FaqRetriever:
+    """Immutable snapshot of the FAQ index, shared read-only by all sessions.
+
+    A new snapshot replaces the old one when the index file changes on disk;
+    sessions holding the previous snapshot keep using it until their turn ends.
+    """
+    index: faiss.Index
+    faq_data: tuple
+    id_to_position: dict
+    position_to_id: dict
+    lexical: BM25Index
+    reconstruct: object
+    backend: str
+    path: str
+    mtime_ns: int
+    file_size: int
+    load_seconds: float
+    heap_bytes: int
+    mapped_bytes: int
+    mmap: bool = False
+
+    def search(self, embedding, k=1):
+        """Searches the index for the `k` nearest FAQ entries.
+
+        Args:
+            embedding (list | np.ndarray): query embedding
+            k (int): number of neighbours to return
+
+        Returns:
+            tuple: (distances, ids) arrays of shape (k,); distances are squared
+            L2 (inner-product scores are converted) and ids are stable vector IDs
+        """
+        distances, ids = self.search_batch(np.asarray(embedding, dtype="float32").reshape(1, -1), k)
+        return distances[0], ids[0]
+
+    def search_batch(self, embeddings, k=1):
+        """Searches many queries with one `index.search` call.
+
+        Args:
+            embeddings (np.ndarray): query embeddings, shape (n, d)
+            k (int): neighbours per query
+
+        Returns:
+            tuple: (distances, ids) arrays of shape (n, k), as in `search`
+        """
+        queries = np.ascontiguousarray(embeddings, dtype="float32")
+        if index_backends.normalizes(self.backend):
+            queries = index_backends.prepare(self.backend, queries)
+        with tracing.span("faiss.search", index="faq", backend=self.backend, k=k, queries=len(queries)):
+            scores, ids = self.index.search(queries, k)
+        return index_backends.to_l2_distances(self.index, scores), ids
+
+    def search_top_k(self, embedding, k=3, max_distance=None, mmr_lambda=None, fetch_k=None):
+        """Returns up to `k` relevant FAQ entries as (id, distance) pairs.
+
+        Args:
+            embedding (list | np.ndarray): query embedding
+            k (int): maximum number of entries to return
+            max_distance (float): squared L2 cutoff; farther entries are dropped
+            mmr_lambda (float): if set, re-rank `fetch_k` candidates with
+                maximal marginal relevance (1.0 = relevance only)
+            fetch_k (int): candidates considered by MMR (default 4 * k)
+
+        Returns:
+            list: (id, distance) pairs, best first; empty when nothing qualifies
+        """
+        fetch = max(k, fetch_k or 4 * k) if mmr_lambda is not None else k
+        distances, ids = self.search(embedding, min(fetch, self.index.ntotal))
+        return self._select(embedding, distances, ids, k, max_distance, mmr_lambda)
+
+    def _select(self, embedding, distances, ids, k, max_distance, mmr_lambda):
+        keep = ids >= 0
+        if max_distance is not None:
+            keep &= distances <= max_distance
+        distances, ids = distances[keep], ids[keep]
+        if mmr_lambda is not None and len(ids) > k:
+            order = mmr(embedding, self.vectors(ids), k, mmr_lambda)
+            distances, ids = distances[order], ids[order]
+        return list(zip(ids[:k].tolist(), distances[:k].tolist()))
+
+    def search_hybrid(self, embedding, question, k=3, max_distance=None, mmr_lambda=None,
+                      fetch_k=None, min_lexical_score=0.0, rrf_k=60):
+        """Fuses vector and BM25 rankings with reciprocal rank fusion.
+
+        Vector candidates go through the same cutoff and MMR as
+        `search_top_k`; lexical candidates are questions whose BM25 score
+        reaches `min_lexical_score`, so exact terms ("lucro real", "P&D")
+        can surface entries the embedding ranks low.
+
+        Returns:
+            list: (id, fused score) pairs, best first
+        """
+        fetch = max(k, fetch_k or 4 * k)
+        vector = [vector_id for vector_id, _ in self.search_top_k(
+            embedding, k=fetch, max_distance=max_distance, mmr_lambda=mmr_lambda, fetch_k=fetch)]
+        return self._fuse(vector, question, k, fetch, min_lexical_score, rrf_k)
+
+    def search_hybrid_batch(self, embeddings, questions, k=3, max_distance=None, mmr_lambda=None,
+                            fetch_k=None, min_lexical_score=0.0, rrf_k=60):
+        """`search_hybrid` for many questions, with one vector search for all of them.
+
+        Returns:
+            list: one list of (id, fused score) pairs per question
+        """
+        fetch = max(k, fetch_k or 4 * k)
+        distances, ids = self.search_batch(embeddings, min(fetch, self.index.ntotal))
+        results = []
+        for embedding, question, row_distances, row_ids in zip(embeddings, questions, distances, ids):
+            vector = [vector_id for vector_id, _ in self._select(
+                embedding, row_distances, row_ids, fetch, max_distance, mmr_lambda)]
+            results.append(self._fuse(vector, question, k, fetch, min_lexical_score, rrf_k))
+        return results
+
+    def _fuse(self, vector, question, k, fetch, min_lexical_score, rrf_k):
+        with tracing.span("bm25.search", k=fetch):
+            lexical = [self.position_to_id[position] for position, score in self.lexical.search(question, fetch)
+                       if score >= min_lexical_score and position in self.position_to_id]
+        return reciprocal_rank_fusion([vector, lexical], k=rrf_k)[:k]
+
+    def lexical_match(self, question):
+        """Returns the ID of the FAQ entry `question` matches term for term, or None.
+
+        Needs no embedding, so a hit can be answered without any network call.
+        """
+        with tracing.span("bm25.exact_match") as span:
+            position = self.lexical.exact_match(question)
+            span.set(hit=position is not None)
+        return None if position is None else self.position_to_id.get(position)
+
+    def vectors(self, vector_ids):
+        """Reconstructs the stored vectors for `vector_ids`."""
+        return self.reconstruct(vector_ids)
+
+    def entry(self, vector_id):
+        return self.faq_data[self.id_to_position[int(vector_id)]]
+
+    def answer(self, vector_id):
+        return self.entry(vector_id)[1]
+
+    def stats(self):
+        return {
+            "path": self.path,
+            "vectors": self.index.ntotal,
+            "dimension": self.index.d,
+            "backend": self.backend,
+            "load_seconds": self.load_seconds,
+            "heap_bytes": self.heap_bytes,
+            "mapped_bytes": self.mapped_bytes,
+            "file_bytes": self.file_size,
+            "mmap": self.mmap,
+        }
+
+
+def mmr(query, candidates, k, mmr_lambda):
+    """Maximal marginal relevance over a candidate matrix, vectorised with NumPy.
+
+    Args:
+        query (np.ndarray): query embedding, shape (d,)
+        candidates (np.ndarray): candidate embeddings, shape (n, d), best first
+        k (int): number of items to select
+        mmr_lambda (float): trade-off between relevance (1.0) and diversity (0.0)
+
+    Returns:
+        np.ndarray: indices into `candidates` in selection order
+    """
+    candidates = candidates / np.linalg.norm(candidates, axis=1, keepdims=True)
+    query = np.asarray(query, dtype="float32")
+    relevance = candidates @ (query / np.linalg.norm(query))
+    similarity = candidates @ candidates.T
+    selected = [int(np.argmax(relevance))]
+    max_similarity = similarity[selected[0]].copy()
+    for _ in range(1, min(k, len(candidates))):
+        scores = mmr_lambda * relevance - (1 - mmr_lambda) * max_similarity
+        scores[selected] = -np.inf
+        chosen = int(np.argmax(scores))
+        selected.append(chosen)
+        np.maximum(max_similarity, similarity[chosen], out=max_similarity)
+    return np.array(selected)
+
+
+_retrievers = {}
+_retrievers_lock = threading.Lock()
+
+
+def _file_signature(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _load(faq_data, path, mmap):
+    with tracing.span("index.load", index="faq") as span:
+        retriever = _read(faq_data, path, mmap)
+        span.set(**{key: value for key, value in retriever.stats().items() if key != "path"})
+    return retriever
+
+
+def _read(faq_data, path, mmap):
+    start = time.perf_counter()
+    mtime_ns, file_size = _file_signature(path)
+    index = index_backends.read_index(path, mmap=mmap)
+    manifest = indexing.load_manifest(path)
+    backend = manifest.get("backend", indexing.LEGACY_BACKEND)
+    index_backends.apply_search_params(index, backend["name"], backend["params"])
+    id_to_position = indexing.id_positions(manifest, faq_data)
+    return FaqRetriever(
+        index=index,
+        faq_data=faq_data,
+        id_to_position=id_to_position,
+        position_to_id={position: vector_id for vector_id, position in id_to_position.items()},
+        # Índice léxico construído junto do FAISS, sobre as mesmas perguntas
+        lexical=BM25Index([pergunta for pergunta, _ in faq_data]),
+        reconstruct=index_backends.make_reconstructor(index),
+        backend=backend["name"],
+        path=path,
+        mtime_ns=mtime_ns,
+        file_size=file_size,
+        load_seconds=time.perf_counter() - start,
+        # O arquivo é a forma serializada do índice: lido para o heap ou mapeado pelo SO. As
+        # páginas mapeadas também contam no RSS quando tocadas, só que compartilhadas entre processos
+        heap_bytes=0 if mmap else file_size,
+        mapped_bytes=file_size if mmap else 0,
+        mmap=mmap,
+    )
+
+
+def _is_current(retriever, faq_data):
+    return (retriever is not None
+            and retriever.faq_data == faq_data
+            and os.path.exists(retriever.path)
+            and _file_signature(retriever.path) == (retriever.mtime_ns, retriever.file_size))
+
+
+def get_retriever(faq_data, embed, model, path=None, backend=None, mmap=None):
+    """Returns the process-wide retriever for `path`, reloading it when needed.
+
+    The index is synchronised with `faq_data` (embedding only new or edited
+    questions) the first time it is requested and whenever `faq_data`
+    changes; the snapshot is hot-swapped when the file changes on disk.
+
+    Args:
+        faq_data (list): (question, answer) tuples
+        embed (callable): list of texts -> embeddings, used for the delta only
+        model (str): embedding model name recorded in the manifest
+        path (str): index file on disk (default: `INDEX_PATH` for `model`,
+            see `indexing.model_index_path`)
+        backend (str): index backend used when (re)building, see `ibelt.index_backends`
+        mmap (bool): map the index read-only instead of reading it into the
+            heap (default: `index_backends.MMAP_ENABLED`)
+
+    Returns:
+        FaqRetriever: current snapshot
+    """
+    faq_data = tuple(faq_data)
+    path = path or indexing.model_index_path(INDEX_PATH, model)
+    current = _retrievers.get(path)
+    if _is_current(current, faq_data):
+        return current
+
+    with _retrievers_lock:
+        current = _retrievers.get(path)
+        if _is_current(current, faq_data):
+            return current
+        if current is None or current.faq_data != faq_data:
+            with tracing.span("index.sync", index="faq") as span:
+                added, removed = indexing.sync_index(faq_data, embed, model, path, backend=backend)
+                span.set(added=added, removed=removed)
+        current = _load(faq_data, path, index_backends.MMAP_ENABLED if mmap is None else mmap)
+        _retrievers[path] = current
+        return current
+
+
+def evict_retriever(path):
+    """Forgets the retriever loaded for `path`; the next `get_retriever` reads the index again.
+
+    Callers still holding the old snapshot keep a working reference until they drop it.
+    """
+    with _retrievers_lock:
+        _retrievers.pop(path, None)
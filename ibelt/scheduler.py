@@ -0,0 +1,144 @@
+import asyncio
+import heapq
+import itertools
+import time
+
+from ibelt.tokens import count_tokens
+
+# Prioridades: menor número é atendido primeiro
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+# Reserva de saída quando a chamada não define max_tokens (a OpenAI conta max_tokens no TPM)
+DEFAULT_COMPLETION_TOKENS = 512
+
+
+class TokenBucket:
+    """Bucket refilled continuously at `limit_per_minute / 60` units per second.
+
+    A `None` limit never runs dry.
+    """
+
+    def __init__(self, limit_per_minute):
+        self.capacity = limit_per_minute
+        self.level = float(limit_per_minute or 0)
+        self.rate = (limit_per_minute or 0) / 60.0
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now, reserve=0.0):
+        """Seconds until `amount` units are available (0 if they are now) while
+        leaving a `reserve` fraction of the capacity untouched."""
+        if self.capacity is None:
+            return 0.0
+        self._refill(now)
+        # Um pedido maior que o balde inteiro espera o balde encher e passa sozinho
+        amount = min(amount + reserve * self.capacity, self.capacity)
+        return max(0.0, (amount - self.level) / self.rate)
+
+    def take(self, amount):
+        if self.capacity is not None:
+            self.level -= amount
+
+    def give_back(self, amount):
+        if self.capacity is not None:
+            self.level = min(self.capacity, self.level + amount)
+
+
+class RateLimiter:
+    """Client-side RPM/TPM limiter with priorities, for use on one event loop.
+
+    Requests wait in a priority queue (then FIFO) and are admitted when both
+    the request and the token bucket can pay for them, so a burst queues
+    locally instead of turning into 429s. Lower-priority requests also leave
+    `background_reserve` of each budget free, so a burst of background work
+    cannot drain what user-facing replies need. Token costs are estimates; callers
+    return the unused part with `settle` once the real usage is known. A 429
+    from the server anyway pauses admissions for its retry-after delay.
+
+    Args:
+        rpm (int): requests per minute (None = unlimited)
+        tpm (int): tokens per minute (None = unlimited)
+        background_reserve (float): fraction of each budget only
+            `PRIORITY_INTERACTIVE` requests may use
+    """
+
+    def __init__(self, rpm=None, tpm=None, background_reserve=0.2):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.background_reserve = background_reserve
+        self._queue = []
+        self._order = itertools.count()
+        self._timer = None
+        self._paused_until = 0.0
+        self.waited_seconds = 0.0
+
+    async def acquire(self, tokens, priority=PRIORITY_INTERACTIVE):
+        """Waits until a request costing `tokens` may be sent."""
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._order), tokens, future))
+        start = time.monotonic()
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Se a permissão já tinha sido concedida, devolve o que foi reservado
+            if future.done() and not future.cancelled():
+                self.settle(tokens, 0, refund_request=True)
+            raise
+        finally:
+            self.waited_seconds += time.monotonic() - start
+
+    def settle(self, estimated, actual, refund_request=False):
+        """Returns the difference between the reserved and the actual token cost."""
+        if estimated > actual:
+            self.tokens.give_back(estimated - actual)
+        if refund_request:
+            self.requests.give_back(1)
+        self._dispatch()
+
+    def pause(self, seconds):
+        """Stops admissions for `seconds`, e.g. after a 429 with retry-after."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._dispatch()
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._queue:
+            priority, _, tokens, future = self._queue[0]
+            if future.cancelled():
+                heapq.heappop(self._queue)
+                continue
+            now = time.monotonic()
+            reserve = self.background_reserve if priority > PRIORITY_INTERACTIVE else 0.0
+            wait = max(self._paused_until - now, self.requests.wait_time(1, now, reserve),
+                       self.tokens.wait_time(tokens, now, reserve))
+            if wait > 0:
+                self._timer = asyncio.get_running_loop().call_later(wait, self._dispatch)
+                return
+            heapq.heappop(self._queue)
+            self.requests.take(1)
+            self.tokens.take(tokens)
+            future.set_result(None)
+
+    def stats(self):
+        return {"queued": len(self._queue), "waited_seconds": self.waited_seconds}
+
+
+def estimate_chat_tokens(kwargs):
+    """Prompt tokens plus the completion allowance, as the API charges the TPM budget."""
+    model = kwargs.get("model", "gpt-4o")
+    prompt = sum(count_tokens(m["content"], model) + 4 for m in kwargs.get("messages", [])
+                 if isinstance(m.get("content"), str))
+    completion = kwargs.get("max_completion_tokens") or kwargs.get("max_tokens") or DEFAULT_COMPLETION_TOKENS
+    return prompt + completion
+
+
+def estimate_embedding_tokens(kwargs):
+    texts = kwargs["input"] if isinstance(kwargs["input"], list) else [kwargs["input"]]
+    return sum(count_tokens(text, kwargs.get("model", "text-embedding-3-small")) for text in texts)
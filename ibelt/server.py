@@ -0,0 +1,238 @@
+"""HTTP API for the chatbots, as a plain ASGI application.
+
+    python -m ibelt serve --port 8080
+    uvicorn ibelt.server:app --port 8080
+
+Routes (`{bot}` is "consultor" or "agente_comercial"):
+
+    POST /v1/{bot}/conversations                 -> {"conversation_id"}
+    POST /v1/{bot}/conversations/{id}/messages   {"message", "stream"=true}
+    GET  /v1/{bot}/conversations/{id}/messages   ?before=&limit=
+    GET  /v1/agente_comercial/conversations/{id}/lead
+    GET  /healthz
+    GET  /metrics                                Prometheus, see ibelt.tracing
+
+A streamed reply is a `text/event-stream` of `token` events
+(`{"text"}`) and a final `done` event (`{"answer", "trace_id",
+"breakdown"}`), or `error`. Closing the connection cancels the model call.
+"""
+import asyncio
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+from ibelt import tracing
+from ibelt.bots import BOTS, CONVERSATION_ID, ConversationPool, new_conversation_id
+from ibelt.sessions import TurnConflictError, get_session_store
+
+MAX_MESSAGE_CHARS = 4000
+MAX_BODY_BYTES = 64 * 1024
+
+_ROUTE = re.compile(r"^/v1/(?P<bot>[a-z_]+)/conversations(?:/(?P<id>[^/]+)/(?P<resource>messages|lead))?$")
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class ChatAPI:
+    """ASGI application serving a `ConversationPool`.
+
+    The chatbots are synchronous, so each turn runs on a worker thread and
+    its text fragments are handed to the event loop as they arrive; the
+    LLM calls inside still share the process-wide gateway and its
+    connection pool. The pool is created at startup, so importing the
+    module costs nothing.
+
+    Args:
+        pool (ConversationPool): default: one over `get_session_store()`
+        max_turns (int): turns running at once; more wait for a thread
+        allowed_origins (list): origins allowed by CORS (e.g. the website widget)
+    """
+
+    def __init__(self, pool=None, max_turns=64, allowed_origins=()):
+        self.pool = pool
+        self.allowed_origins = set(allowed_origins)
+        self._executor = ThreadPoolExecutor(max_workers=max_turns, thread_name_prefix="ibelt-api")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+        if self.pool is None:
+            self.pool = ConversationPool(get_session_store())
+        headers = {k.decode("latin-1"): v.decode("latin-1") for k, v in scope["headers"]}
+        cors = self._cors_headers(headers.get("origin"))
+        try:
+            if scope["method"] == "OPTIONS":
+                await _respond(send, 204, b"", cors + [
+                    (b"access-control-allow-methods", b"GET, POST, OPTIONS"),
+                    (b"access-control-allow-headers", b"content-type")])
+                return
+            await self._route(scope, receive, send, cors)
+        except HTTPError as e:
+            await _respond_json(send, e.status, {"error": str(e)}, cors)
+        except TurnConflictError as e:
+            # Outro worker gravou um turno desta conversa ao mesmo tempo; o cliente pode repetir
+            await _respond_json(send, 409, {"error": str(e)}, cors)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                if self.pool is None:
+                    self.pool = ConversationPool(get_session_store())
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self.pool.store.flush()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def _cors_headers(self, origin):
+        if origin and ("*" in self.allowed_origins or origin in self.allowed_origins):
+            return [(b"access-control-allow-origin", origin.encode("latin-1")), (b"vary", b"origin")]
+        return []
+
+    async def _route(self, scope, receive, send, cors):
+        method, path = scope["method"], scope["path"]
+        if path == "/healthz" and method == "GET":
+            await _respond_json(send, 200, {"status": "ok"}, cors)
+            return
+        if path == "/metrics" and method == "GET":
+            await _respond(send, 200, tracing.get_tracer().prometheus().encode(),
+                           cors + [(b"content-type", b"text/plain; version=0.0.4")])
+            return
+        match = _ROUTE.match(path)
+        if match is None:
+            raise HTTPError(404, "Rota não encontrada")
+        bot, conversation_id, resource = match["bot"], match["id"], match["resource"]
+        if bot not in BOTS:
+            raise HTTPError(404, f"Bot desconhecido: {bot}")
+        if conversation_id is not None and not CONVERSATION_ID.match(conversation_id):
+            raise HTTPError(400, "conversation_id inválido")
+
+        if resource is None and method == "POST":
+            await _respond_json(send, 201, {"conversation_id": new_conversation_id()}, cors)
+        elif resource == "messages" and method == "GET":
+            query = parse_qs(scope["query_string"].decode("latin-1"))
+            try:
+                before = int(query["before"][0]) if "before" in query else None
+                limit = min(int(query.get("limit", ["20"])[0]), 200)
+            except ValueError:
+                raise HTTPError(400, "before e limit devem ser inteiros")
+            turns = await self._in_thread(self.pool.history, bot, conversation_id, before, limit)
+            await _respond_json(send, 200, {"messages": [
+                {"seq": t.seq, "role": t.role, "content": t.content} for t in turns]}, cors)
+        elif resource == "messages" and method == "POST":
+            body = await _read_json(receive)
+            message = body.get("message")
+            if not isinstance(message, str) or not message.strip() or len(message) > MAX_MESSAGE_CHARS:
+                raise HTTPError(400, f"message deve ser um texto de 1 a {MAX_MESSAGE_CHARS} caracteres")
+            reply = self.pool.reply(bot, conversation_id, message)
+            if body.get("stream", True):
+                await self._stream(reply, receive, send, cors)
+            else:
+                answer = await self._in_thread(lambda: "".join(reply).strip())
+                await _respond_json(send, 200, {"answer": answer, **_trace_summary(reply.trace)}, cors)
+        elif resource == "lead" and method == "GET" and bot == "agente_comercial":
+            lead = await self._in_thread(self.pool.lead, conversation_id)
+            await _respond_json(send, 200, {"lead": lead}, cors)
+        else:
+            raise HTTPError(405, "Método não permitido")
+
+    async def _in_thread(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def _stream(self, reply, receive, send, cors):
+        loop = asyncio.get_running_loop()
+        events = asyncio.Queue()
+        disconnected = threading.Event()
+
+        def produce():
+            partes = []
+            try:
+                for parte in reply:
+                    if disconnected.is_set():
+                        break
+                    partes.append(parte)
+                    loop.call_soon_threadsafe(events.put_nowait, ("token", {"text": parte}))
+                else:
+                    loop.call_soon_threadsafe(events.put_nowait, ("done", {
+                        "answer": "".join(partes).strip(), **_trace_summary(reply.trace)}))
+            except Exception as e:
+                loop.call_soon_threadsafe(events.put_nowait, ("error", {"error": f"{type(e).__name__}: {e}"}))
+            finally:
+                # Fecha o gerador nesta thread: cancela a chamada ao modelo e libera a conversa
+                reply.close()
+                loop.call_soon_threadsafe(events.put_nowait, None)
+
+        async def watch_disconnect():
+            while (await receive())["type"] != "http.disconnect":
+                pass
+            disconnected.set()
+
+        await send({"type": "http.response.start", "status": 200, "headers": cors + [
+            (b"content-type", b"text/event-stream; charset=utf-8"),
+            (b"cache-control", b"no-cache"),
+            (b"x-accel-buffering", b"no")]})
+        watcher = asyncio.ensure_future(watch_disconnect())
+        producer = loop.run_in_executor(self._executor, produce)
+        try:
+            while (event := await events.get()) is not None:
+                name, data = event
+                chunk = f"event: {name}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+                await send({"type": "http.response.body", "body": chunk.encode("utf-8"), "more_body": True})
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            disconnected.set()
+            watcher.cancel()
+            await producer
+
+
+def _trace_summary(trace):
+    if trace is None:
+        return {}
+    return {"trace_id": trace.trace_id, "breakdown": trace.breakdown()}
+
+
+async def _read_json(receive):
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if len(body) > MAX_BODY_BYTES:
+            raise HTTPError(413, "Corpo da requisição muito grande")
+        if not message.get("more_body"):
+            break
+    try:
+        data = json.loads(body or b"{}")
+    except ValueError:
+        raise HTTPError(400, "JSON inválido")
+    if not isinstance(data, dict):
+        raise HTTPError(400, "O corpo deve ser um objeto JSON")
+    return data
+
+
+async def _respond(send, status, body, headers):
+    await send({"type": "http.response.start", "status": status,
+                "headers": headers + [(b"content-length", str(len(body)).encode())]})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _respond_json(send, status, data, headers):
+    await _respond(send, status, json.dumps(data, ensure_ascii=False).encode("utf-8"),
+                   headers + [(b"content-type", b"application/json")])
+
+
+# `IBELT_API_MAX_TURNS` limita os turnos simultâneos; `IBELT_API_ALLOWED_ORIGINS` libera CORS
+app = ChatAPI(max_turns=int(os.environ.get("IBELT_API_MAX_TURNS", 64)),
+              allowed_origins=[o.strip() for o in os.environ.get("IBELT_API_ALLOWED_ORIGINS", "").split(",")
+                               if o.strip()])
@@ -0,0 +1,267 @@
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+
+from ibelt.embedding_cache import CACHE_DIR
+
+
+@dataclass(frozen=True)
+class Turn:
+    """One stored chat message; `seq` orders the turns of a conversation from 0."""
+    seq: int
+    role: str
+    content: str
+
+
+class TurnConflictError(Exception):
+    """A turn was appended with a (conversation, seq) that is already stored."""
+
+    def __init__(self, conflicts):
+        super().__init__("Turnos já gravados com a mesma sequência: "
+                         + ", ".join(f"{cid}#{seq}" for cid, seq in conflicts))
+        self.conflicts = conflicts
+
+
+def _page(turns, before, limit):
+    turns = sorted((t for t in turns if before is None or t.seq < before), key=lambda t: t.seq)
+    return turns[-limit:] if limit else turns
+
+
+class MemorySessionStore:
+    """Session store kept in the process; state is lost when the worker stops.
+
+    Same interface as `SQLiteSessionStore`: `append_turn`, `load_turns`,
+    `last_seq`, `put_state`, `get_state`, `flush` and `close`.
+    """
+
+    def __init__(self):
+        self._turns = {}
+        self._state = {}
+        self._lock = threading.Lock()
+
+    def append_turn(self, conversation_id, seq, role, content):
+        with self._lock:
+            turns = self._turns.setdefault(conversation_id, {})
+            if seq in turns:
+                raise TurnConflictError([(conversation_id, seq)])
+            turns[seq] = Turn(seq, role, content)
+
+    def load_turns(self, conversation_id, before=None, limit=None):
+        with self._lock:
+            return _page(self._turns.get(conversation_id, {}).values(), before, limit)
+
+    def last_seq(self, conversation_id):
+        with self._lock:
+            return max(self._turns.get(conversation_id, {}), default=-1)
+
+    def put_state(self, conversation_id, key, value):
+        with self._lock:
+            self._state[conversation_id, key] = json.loads(json.dumps(value))
+
+    def get_state(self, conversation_id, key, default=None):
+        with self._lock:
+            return self._state.get((conversation_id, key), default)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+    def stats(self):
+        with self._lock:
+            return {"conversations": len(self._turns),
+                    "turns": sum(len(turns) for turns in self._turns.values())}
+
+
+class SQLiteSessionStore:
+    """Durable session store on a SQLite database in WAL mode.
+
+    Turns are append-only rows keyed by (conversation, seq); a turn whose
+    seq is already stored is never overwritten or dropped, `flush` raises
+    `TurnConflictError` for it. Per-conversation state (lead data, running
+    summary) is a JSON value per key. Writes are
+    queued and a background thread commits them in batches every
+    `flush_interval` seconds, so a chat turn never waits on the disk; reads
+    merge the queued writes, and pending writes are flushed at exit. WAL lets
+    other worker processes on the same file read while one writes, so any
+    worker can resume a conversation after a reconnect or restart.
+
+    Args:
+        path (str): database file
+        flush_interval (float): seconds between batched commits
+        max_batch (int): queued writes that trigger an early flush
+    """
+
+    def __init__(self, path, flush_interval=0.25, max_batch=512):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # Em WAL, NORMAL só perde o último lote numa queda de energia, nunca corrompe o banco
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS turns ("
+            "conversation_id TEXT NOT NULL, seq INTEGER NOT NULL, role TEXT NOT NULL, "
+            "content TEXT NOT NULL, created_at REAL NOT NULL, "
+            "PRIMARY KEY (conversation_id, seq)) WITHOUT ROWID")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS conversation_state ("
+            "conversation_id TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+            "updated_at REAL NOT NULL, PRIMARY KEY (conversation_id, key)) WITHOUT ROWID")
+        self._db.commit()
+        self._db_lock = threading.Lock()
+        self._pending_turns = []
+        self._pending_state = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self.flushes = 0
+        self.flushed_writes = 0
+        self._writer = threading.Thread(target=self._run, name="ibelt-session-store", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except TurnConflictError as e:
+                print(f"Erro ao gravar turnos: {e}")
+
+    def append_turn(self, conversation_id, seq, role, content):
+        with self._lock:
+            self._pending_turns.append((conversation_id, seq, role, content, time.time()))
+            full = len(self._pending_turns) >= self.max_batch
+        if full:
+            self._wake.set()
+
+    def put_state(self, conversation_id, key, value):
+        # Gravações seguidas da mesma chave no mesmo lote viram uma só
+        with self._lock:
+            self._pending_state[conversation_id, key] = (json.dumps(value, ensure_ascii=False), time.time())
+
+    def load_turns(self, conversation_id, before=None, limit=None):
+        """Returns the newest `limit` turns with seq < `before` (all if None), oldest first."""
+        # Copia o que está na fila antes de ler o banco: um flush no meio não perde nada
+        with self._lock:
+            pending = [Turn(seq, role, content) for cid, seq, role, content, _ in self._pending_turns
+                       if cid == conversation_id]
+        query = "SELECT seq, role, content FROM turns WHERE conversation_id = ?"
+        params = [conversation_id]
+        if before is not None:
+            query += " AND seq < ?"
+            params.append(before)
+        query += " ORDER BY seq DESC"
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+        with self._db_lock:
+            rows = self._db.execute(query, params).fetchall()
+        turns = {seq: Turn(seq, role, content) for seq, role, content in rows}
+        turns.update((turn.seq, turn) for turn in pending)
+        return _page(turns.values(), before, limit)
+
+    def last_seq(self, conversation_id):
+        """Returns the highest stored or queued seq of the conversation (-1 if it has none)."""
+        with self._lock:
+            pending = max((seq for cid, seq, _, _, _ in self._pending_turns if cid == conversation_id), default=-1)
+        with self._db_lock:
+            row = self._db.execute("SELECT MAX(seq) FROM turns WHERE conversation_id = ?",
+                                   (conversation_id,)).fetchone()
+        return max(pending, -1 if row[0] is None else row[0])
+
+    def get_state(self, conversation_id, key, default=None):
+        with self._lock:
+            pending = self._pending_state.get((conversation_id, key))
+        if pending is not None:
+            return json.loads(pending[0])
+        with self._db_lock:
+            row = self._db.execute("SELECT value FROM conversation_state WHERE conversation_id = ? AND key = ?",
+                                   (conversation_id, key)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def flush(self):
+        """Commits the queued writes in one transaction.
+
+        Raises:
+            TurnConflictError: some turns reused a stored (conversation, seq);
+                they are left out, the rest of the batch is committed
+        """
+        with self._lock:
+            turns, self._pending_turns = self._pending_turns, []
+            state, self._pending_state = self._pending_state, {}
+        if not turns and not state:
+            return
+        conflicts = []
+        with self._db_lock, self._db:
+            for turn in turns:
+                # Um INSERT que falha só desfaz a própria linha; o resto do lote segue na transação
+                try:
+                    self._db.execute(
+                        "INSERT INTO turns (conversation_id, seq, role, content, created_at) "
+                        "VALUES (?, ?, ?, ?, ?)", turn)
+                except sqlite3.IntegrityError:
+                    conflicts.append(turn[:2])
+            self._db.executemany(
+                "INSERT OR REPLACE INTO conversation_state (conversation_id, key, value, updated_at) "
+                "VALUES (?, ?, ?, ?)", [(cid, key, value, updated) for (cid, key), (value, updated) in state.items()])
+        self.flushes += 1
+        self.flushed_writes += len(turns) - len(conflicts) + len(state)
+        if conflicts:
+            raise TurnConflictError(conflicts)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._writer.join()
+        self.flush()
+        self._db.close()
+
+    def stats(self):
+        with self._lock:
+            pending = len(self._pending_turns) + len(self._pending_state)
+        return {"path": self.path, "pending_writes": pending, "flushes": self.flushes,
+                "flushed_writes": self.flushed_writes}
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_session_store():
+    """Returns the process-wide session store.
+
+    `IBELT_SESSION_STORE=memory` keeps sessions in the process only; the
+    default "sqlite" writes to `IBELT_SESSION_DB` (default
+    `<IBELT_CACHE_DIR>/sessions.sqlite`), which every worker on the host can share.
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            if os.environ.get("IBELT_SESSION_STORE", "sqlite") == "memory":
+                _store = MemorySessionStore()
+            else:
+                _store = SQLiteSessionStore(
+                    os.environ.get("IBELT_SESSION_DB") or os.path.join(CACHE_DIR, "sessions.sqlite"))
+        return _store
+
+
+def _reset_after_fork():
+    # A thread de gravação não existe no processo filho; abre outro store sob demanda
+    global _store, _store_lock
+    _store, _store_lock = None, threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
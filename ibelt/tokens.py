@@ -0,0 +1,27 @@
+import functools
+
+
+@functools.lru_cache(maxsize=None)
+def _encoding(model):
+    try:
+        import tiktoken
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # Sem acesso aos arquivos do tiktoken (ex.: ambiente offline)
+        print(f"Tokenizer indisponível para {model}, usando estimativa: {e}")
+        return None
+
+
+def count_tokens(text, model="gpt-4o"):
+    """Counts tokens with the model's local tokenizer.
+
+    Falls back to a conservative estimate (one token per three UTF-8 bytes)
+    when the tokenizer files cannot be loaded.
+    """
+    encoding = _encoding(model)
+    if encoding is None:
+        return len(text.encode("utf-8")) // 3 + 1
+    return len(encoding.encode(text))
@@ -0,0 +1,316 @@
+import contextvars
+import json
+import os
+import secrets
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Limites (em segundos) dos buckets do histograma de duração
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Atributos com contagem de tokens (convenção GenAI do OpenTelemetry)
+TOKEN_ATTRIBUTE_PREFIX = "gen_ai.usage."
+
+_current = contextvars.ContextVar("ibelt_current_span", default=None)
+
+
+class Span:
+    """One timed stage of a trace; ended spans are immutable in practice.
+
+    Args:
+        name (str): stage name, e.g. "faiss.search"
+        trace (Trace): trace the span belongs to
+        parent (Span): enclosing span, or None for the root
+        attributes (dict): initial attributes
+    """
+
+    def __init__(self, name, trace, parent=None, attributes=None):
+        self.name = name
+        self.trace = trace
+        self.parent_id = parent.span_id if parent is not None else None
+        self.span_id = secrets.token_hex(8)
+        self.attributes = dict(attributes or {})
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = None
+        self._start = time.perf_counter()
+        self.seconds = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+        return self
+
+    def end(self, error=None):
+        if self.end_ns is not None:
+            return
+        self.seconds = time.perf_counter() - self._start
+        self.end_ns = self.start_ns + int(self.seconds * 1e9)
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        self.trace._finish(self)
+
+    def to_otlp(self):
+        span = {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id is not None:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        # int64 vai como string no JSON do OTLP
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class Trace:
+    """Spans recorded for one unit of work, typically a chat turn.
+
+    Spans may end on other threads (background lead extraction) and after
+    the root; late spans are appended here and exported on their own.
+    """
+
+    def __init__(self, tracer, name, attributes=None):
+        self.tracer = tracer
+        self.trace_id = secrets.token_hex(16)
+        self.spans = []
+        self.finished = False
+        self._lock = threading.Lock()
+        self.root = Span(name, self, attributes=attributes)
+
+    def _finish(self, span):
+        with self._lock:
+            self.spans.append(span)
+            late = self.finished
+            if span is self.root:
+                self.finished = True
+        self.tracer.record(span)
+        if span is self.root:
+            self.tracer.finish(self)
+        elif late:
+            self.tracer.export([span])
+
+    def breakdown(self):
+        """Ended spans as rows (stage, depth, start offset, duration, tokens), in start order."""
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s.start_ns)
+        depth = {self.root.span_id: 0}
+        rows = []
+        for span in spans:
+            depth[span.span_id] = depth.get(span.parent_id, -1) + 1
+            rows.append({
+                "stage": span.name,
+                "depth": depth[span.span_id],
+                "start_ms": (span.start_ns - self.root.start_ns) / 1e6,
+                "duration_ms": span.seconds * 1e3,
+                "tokens": {key[len(TOKEN_ATTRIBUTE_PREFIX):]: value for key, value in span.attributes.items()
+                           if key.startswith(TOKEN_ATTRIBUTE_PREFIX)},
+                "error": span.error,
+            })
+        return rows
+
+    def to_otlp(self, spans=None):
+        """Spans as an OTLP/JSON `ExportTraceServiceRequest` body."""
+        if spans is None:
+            with self._lock:
+                spans = list(self.spans)
+        return {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.tracer.service}}]},
+            "scopeSpans": [{"scope": {"name": "ibelt.tracing"}, "spans": [span.to_otlp() for span in spans]}],
+        }]}
+
+
+class _Histogram:
+    def __init__(self):
+        self.buckets = [0] * len(DURATION_BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if value <= bound:
+                self.buckets[i] += 1
+
+
+class Tracer:
+    """Collects spans, aggregates Prometheus metrics and exports finished traces.
+
+    Every ended span feeds a duration histogram per stage name and a token
+    counter per stage and token type. Finished traces are kept in a ring
+    buffer and, with `export_path`, appended to it as OTLP/JSON lines (the
+    format read by the OpenTelemetry Collector's `otlpjsonfile` receiver).
+
+    Args:
+        service (str): `service.name` resource attribute
+        history (int): finished traces kept in memory
+        export_path (str): JSON lines file for finished traces (None = no export)
+    """
+
+    def __init__(self, service="ibelt", history=200, export_path=None):
+        self.service = service
+        self.export_path = export_path
+        self.recent = deque(maxlen=history)
+        self._durations = {}
+        self._errors = {}
+        self._tokens = {}
+        self._lock = threading.Lock()
+
+    def start_trace(self, name, **attributes):
+        return Trace(self, name, attributes)
+
+    def record(self, span):
+        with self._lock:
+            self._durations.setdefault(span.name, _Histogram()).observe(span.seconds)
+            if span.error:
+                self._errors[span.name] = self._errors.get(span.name, 0) + 1
+            for key, value in span.attributes.items():
+                if key.startswith(TOKEN_ATTRIBUTE_PREFIX) and isinstance(value, int):
+                    label = (span.name, key[len(TOKEN_ATTRIBUTE_PREFIX):])
+                    self._tokens[label] = self._tokens.get(label, 0) + value
+
+    def finish(self, trace):
+        self.recent.append(trace)
+        self.export(trace.spans, trace)
+
+    def export(self, spans, trace=None):
+        if not self.export_path or not spans:
+            return
+        line = json.dumps((trace or spans[0].trace).to_otlp(list(spans)), ensure_ascii=False)
+        with self._lock, open(self.export_path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    def prometheus(self):
+        """Metrics in the Prometheus text exposition format."""
+        with self._lock:
+            lines = ["# HELP ibelt_span_duration_seconds Duration of traced stages.",
+                     "# TYPE ibelt_span_duration_seconds histogram"]
+            for name, histogram in sorted(self._durations.items()):
+                for bound, count in zip(DURATION_BUCKETS, histogram.buckets):
+                    lines.append(f'ibelt_span_duration_seconds_bucket{{span="{name}",le="{bound}"}} {count}')
+                lines.append(f'ibelt_span_duration_seconds_bucket{{span="{name}",le="+Inf"}} {histogram.count}')
+                lines.append(f'ibelt_span_duration_seconds_sum{{span="{name}"}} {histogram.sum}')
+                lines.append(f'ibelt_span_duration_seconds_count{{span="{name}"}} {histogram.count}')
+            lines += ["# HELP ibelt_span_errors_total Traced stages that ended with an exception.",
+                      "# TYPE ibelt_span_errors_total counter"]
+            lines += [f'ibelt_span_errors_total{{span="{name}"}} {count}'
+                      for name, count in sorted(self._errors.items())]
+            lines += ["# HELP ibelt_tokens_total Tokens reported by traced stages.",
+                      "# TYPE ibelt_tokens_total counter"]
+            lines += [f'ibelt_tokens_total{{span="{name}",type="{kind}"}} {count}'
+                      for (name, kind), count in sorted(self._tokens.items())]
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port, host="0.0.0.0"):
+        """Serves `/metrics` (Prometheus) and `/traces` (recent traces, OTLP/JSON) on a daemon thread."""
+        tracer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body, content_type = tracer.prometheus().encode(), "text/plain; version=0.0.4"
+                elif self.path == "/traces":
+                    traces = [trace.to_otlp() for trace in list(tracer.recent)]
+                    body, content_type = json.dumps(traces).encode(), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name="ibelt-metrics", daemon=True).start()
+        return server
+
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer():
+    """Returns the process-wide tracer, created on first use.
+
+    `IBELT_TRACE_FILE` appends finished traces to a JSON lines file and
+    `IBELT_METRICS_PORT` serves `/metrics` and `/traces` over HTTP.
+    """
+    global _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            _tracer = Tracer(export_path=os.environ.get("IBELT_TRACE_FILE") or None)
+            if os.environ.get("IBELT_METRICS_PORT"):
+                _tracer.serve(int(os.environ["IBELT_METRICS_PORT"]))
+        return _tracer
+
+
+def current_span():
+    return _current.get()
+
+
+def start_span(name, parent=None, **attributes):
+    """Starts a span without making it current; the caller must call `end()`.
+
+    For stages that span generator yields, where the current span of the
+    consuming code must not change. Without a parent (and no current span)
+    the span is the root of a new trace.
+    """
+    parent = parent or _current.get()
+    if parent is None:
+        return get_tracer().start_trace(name, **attributes).root
+    return Span(name, parent.trace, parent, attributes)
+
+
+@contextmanager
+def span(name, **attributes):
+    """Times the enclosed block as a child of the current span.
+
+    Yields the `Span`, so the block can add attributes (`span.set(...)`).
+    An exception is recorded on the span and re-raised.
+    """
+    current = start_span(name, **attributes)
+    token = _current.set(current)
+    try:
+        yield current
+    except Exception as e:
+        current.end(error=e)
+        raise
+    finally:
+        _current.reset(token)
+        current.end()
+
+
+@contextmanager
+def turn(name, **attributes):
+    """Opens a new trace for one chat turn and yields the `Trace`."""
+    trace = get_tracer().start_trace(name, **attributes)
+    token = _current.set(trace.root)
+    try:
+        yield trace
+    except Exception as e:
+        trace.root.end(error=e)
+        raise
+    finally:
+        _current.reset(token)
+        trace.root.end()
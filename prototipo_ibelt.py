@@ -62,7 +62,7 @@ faq_data = [
 client = OpenAI(api_key = userdata.get('OPENAI_API_KEY'))
 
 def criar_indice_faiss(faq_data):
-    embeddings = np.array([obter_embedding_real(pergunta) for pergunta, _ in faq_data]).astype('float32')
+    embeddings = obter_embeddings_em_lote([pergunta for pergunta, _ in faq_data])
     index = faiss.IndexFlatL2(embeddings.shape[1])
     index.add(embeddings)
     return index, embeddings
@@ -81,6 +81,16 @@ def obter_embedding_real(text):
     embedding = client.embeddings.create(input = [text], model=model).data[0].embedding
     return embedding
 
+def obter_embeddings_em_lote(textos, tamanho_lote=2048):
+    # Uma chamada por lote em vez de uma por pergunta
+    model="text-embedding-3-small"
+    embeddings = np.empty((len(textos), 1536), dtype='float32')
+    for inicio in range(0, len(textos), tamanho_lote):
+        lote = [texto.replace("\n", " ") for texto in textos[inicio:inicio + tamanho_lote]]
+        dados = client.embeddings.create(input = lote, model=model).data
+        embeddings[inicio:inicio + len(lote)] = [item.embedding for item in dados]
+    return embeddings
+
 def encontrar_resposta(pergunta, index, embeddings, faq_data):
     pergunta_embedding = obter_embedding_real(pergunta)
     _, indices = index.search(np.array([pergunta_embedding]), 1)
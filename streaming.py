@@ -1,11 +1,71 @@
+import io
+import time
+
 from langchain.callbacks.base import BaseCallbackHandler
 
+from ibelt import tracing
+
 class StreamHandler(BaseCallbackHandler):
-    
-    def __init__(self, container, initial_text=""):
+    """Renders streamed tokens into a streamlit container.
+
+    Tokens are buffered and the container is re-rendered at most once per
+    `flush_interval` seconds or every `flush_every` tokens, whichever comes
+    first. `flush` runs when the LLM finishes so the last tokens are shown.
+    """
+
+    def __init__(self, container, initial_text="", flush_interval=0.05, flush_every=32):
         self.container = container
-        self.text = initial_text
+        self.flush_interval = flush_interval
+        self.flush_every = flush_every
+        self.renders = 0
+        self.render_seconds = 0.0
+        self._buffer = io.StringIO(initial_text)
+        self._buffer.seek(0, io.SEEK_END)
+        self._pending = 0
+        self._last_flush = time.monotonic()
+
+    @property
+    def text(self):
+        return self._buffer.getvalue()
 
     def on_llm_new_token(self, token: str, **kwargs):
-        self.text += token
-        self.container.markdown(self.text)
\ No newline at end of file
+        self._buffer.write(token)
+        self._pending += 1
+        if self._pending >= self.flush_every or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def on_llm_end(self, response, **kwargs):
+        self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        start = time.perf_counter()
+        self.container.markdown(self.text)
+        self.render_seconds += time.perf_counter() - start
+        self.renders += 1
+        self._pending = 0
+        self._last_flush = time.monotonic()
+
+
+def stream_to_container(tokens, container):
+    """Renders a token iterator incrementally and returns the full text.
+
+    Traced as a "render" span covering the whole stream; its `render_ms`
+    attribute is the part spent updating the container.
+
+    Args:
+        tokens (Iterable[str]): text fragments, e.g. from a streamed completion
+        container: streamlit placeholder to render into (e.g. `st.empty()`)
+    """
+    # Não vira o span atual: as etapas que o gerador executa seguem filhas do turno
+    span = tracing.start_span("render")
+    handler = StreamHandler(container)
+    try:
+        for token in tokens:
+            handler.on_llm_new_token(token)
+        handler.flush()
+    finally:
+        span.set(renders=handler.renders, render_ms=handler.render_seconds * 1e3)
+        span.end()
+    return handler.text.strip()
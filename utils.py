@@ -1,26 +1,26 @@
 import os
+import uuid
+import weakref
 import openai
 import random
 import streamlit as st
 from datetime import datetime
 from dotenv import load_dotenv
+from ibelt import llm, resources
+from ibelt.chat_client import get_chat_client
+from ibelt.bots import CONVERSATION_ID
+from ibelt.documents import evict_document_index, get_document_index
+from ibelt.embeddings import get_embedder
+from ibelt.faq import FAQ_DATA
+from ibelt.retriever import evict_retriever, get_retriever
 
 
 #decorator
 def enable_chat_history(func):
     if os.environ.get("OPENAI_API_KEY"):
 
-        # to clear chat history after swtching chatbot
-        current_page = func.__qualname__
-        if "current_page" not in st.session_state:
-            st.session_state["current_page"] = current_page
-        if st.session_state["current_page"] != current_page:
-            try:
-                st.cache_resource.clear()
-                del st.session_state["current_page"]
-                del st.session_state["messages"]
-            except:
-                pass
+        # to clear chat history after swtching chatbot (shared resources are kept)
+        switch_page(func.__qualname__)
 
         # to show chat history on ui
         if "messages" not in st.session_state:
@@ -32,6 +32,134 @@ def enable_chat_history(func):
         func(*args, **kwargs)
     return execute
 
+class _SessionMarker:
+    pass
+
+def session_id():
+    """Id of the current session in the resource registry
+
+    The registry references of the session are released when its state is
+    garbage collected, i.e. when the browser session ends.
+    """
+    if "session_id" not in st.session_state:
+        sid = uuid.uuid4().hex
+        marker = _SessionMarker()
+        weakref.finalize(marker, resources.get_registry().release, sid)
+        st.session_state["session_id"] = sid
+        st.session_state["_session_marker"] = marker
+    return st.session_state["session_id"]
+
+def switch_page(page):
+    """Method to make `page` the current page of the session
+
+    Leaving a page resets its conversation state for this session and drops
+    the session's references to the page resources; the resources themselves
+    stay loaded for other sessions and for the next visit.
+
+    Args:
+        page (str): page name
+
+    Returns:
+        dict: per-session state of `page` (see `page_state`)
+    """
+    previous = st.session_state.get("current_page")
+    if previous is not None and previous != page:
+        resources.get_registry().release(session_id(), previous)
+        st.session_state.pop(f"page_state:{previous}", None)
+        st.session_state.pop("messages", None)
+    st.session_state["current_page"] = page
+    return page_state(page)
+
+def page_state(page):
+    """Per-session state of `page` (chatbot, history), reset when the session leaves it"""
+    key = f"page_state:{page}"
+    if key not in st.session_state:
+        st.session_state[key] = {}
+    return st.session_state[key]
+
+def shared_resource(page, kind, factory, key=None, close=None):
+    """Method to get a process-wide resource (client, embedder, index) for a page
+
+    Args:
+        page (str): page that uses the resource
+        kind (str): resource type
+        factory (callable): builds the resource on first use
+        key (hashable): distinguishes resources of the same kind
+        close (callable): called with the resource if it is evicted
+    """
+    return resources.get_registry().acquire(session_id(), page, kind, factory, key=key, close=close)
+
+def conversation_id(page):
+    """Method to get the id of the session's conversation on `page`
+
+    The id is kept in the URL (`?conversa=`), so a reload or reconnect,
+    served by any worker, resumes the conversation from the session store.
+    """
+    estado = page_state(page)
+    if "conversation_id" not in estado:
+        conversa = st.query_params.get("conversa", "")
+        estado["conversation_id"] = conversa if CONVERSATION_ID.match(conversa) else uuid.uuid4().hex
+        st.query_params["conversa"] = estado["conversation_id"]
+    return estado["conversation_id"]
+
+def chat_client(page):
+    """Method to get the client the page reaches its chatbot through
+
+    With `IBELT_API_URL` the page is a thin client of the API service
+    (`python -m ibelt serve`); otherwise the chatbots run in this process.
+    """
+    if not os.environ.get("IBELT_API_URL"):
+        configure_openai()
+        acquire_local_resources(page)
+    return get_chat_client()
+
+def acquire_local_resources(page):
+    """Method to acquire the heavy objects the chatbot of `page` uses in this process
+
+    The chatbots reach them through the module getters; holding them in the
+    registry counts the sessions using each one, so with
+    `IBELT_RESOURCE_MAX_IDLE_SECONDS` the ones no session has used for that
+    long are freed (and loaded again on the next visit).
+
+    Args:
+        page (str): page name, also the bot name
+    """
+    # O gateway serve todas as páginas, então só é liberado quando a sessão termina
+    shared_resource("app", "llm_gateway", llm.get_gateway, close=llm.close_gateway)
+    if page != "consultor":
+        return
+    embedder = shared_resource(page, "embedder", get_embedder, close=lambda e: e.unload())
+    shared_resource(page, "faq_index", lambda: get_retriever(FAQ_DATA, embedder.embed, embedder.model),
+                    key=embedder.model, close=lambda r: evict_retriever(r.path))
+    shared_resource(page, "documents_index", lambda: get_document_index(embedder.model), key=embedder.model,
+                    close=lambda index: index is not None and evict_document_index(index.path))
+
+def load_chat_history(page, client, conversation, page_size=20):
+    """Method to get the messages shown on `page`, loaded lazily from the session store
+
+    The newest `page_size` messages are read on the first run of the
+    session; older ones only when the user asks for them.
+
+    Args:
+        page (str): page name, also the bot name
+        client: chat client, see `chat_client`
+        conversation (str): id from `conversation_id`
+        page_size (int): messages read at a time
+
+    Returns:
+        list: (role, message) tuples, oldest first
+    """
+    estado = page_state(page)
+    if "chat_history" not in estado:
+        turnos = client.history(page, conversation, limit=page_size)
+        estado["chat_history"] = [(t.role, t.content) for t in turnos]
+        estado["history_from"] = turnos[0].seq if turnos else 0
+    if estado["history_from"] > 0 and st.button("Carregar mensagens anteriores"):
+        turnos = client.history(page, conversation, before=estado["history_from"], limit=page_size)
+        estado["chat_history"][:0] = [(t.role, t.content) for t in turnos]
+        estado["history_from"] = turnos[0].seq if turnos else 0
+    return estado["chat_history"]
+
 def display_msg(msg, author):
     """Method to display message on the UI
 
@@ -48,7 +176,6 @@ def configure_openai():
         os.environ['OPENAI_API_KEY'] = st.secrets["OPENAI_API_KEY"] or os.getenv(
         "OPENAI_API_KEY")
 
-    print("JÁ TENHO A KEY:", os.environ['OPENAI_API_KEY'] )
     # openai_api_key = st.sidebar.text_input(
     #     label="OpenAI API Key",
     #     type="password",
@@ -83,4 +210,26 @@ def configure_openai():
         print(e)
         st.error("Something went wrong. Please try again later.")
         st.stop()
-    return model
\ No newline at end of file
+    return model
+
+def debug_enabled():
+    """Debug panel is on with `IBELT_DEBUG_PANEL=1` or `?debug=1` in the URL."""
+    return os.environ.get("IBELT_DEBUG_PANEL") == "1" or st.query_params.get("debug") == "1"
+
+def show_trace_sidebar(trace):
+    """Method to show the stage timings of a turn in the sidebar
+
+    Args:
+        trace (dict): trace_id and breakdown rows (see `ibelt.tracing.Trace.breakdown`), or None
+    """
+    if trace is None or not debug_enabled():
+        return
+    st.sidebar.subheader("Tempos do último turno")
+    st.sidebar.caption(f"trace {trace['trace_id']}")
+    st.sidebar.dataframe([
+        {"etapa": "\u2003" * row["depth"] + row["stage"],
+         "início (ms)": round(row["start_ms"], 1),
+         "duração (ms)": round(row["duration_ms"], 1),
+         "tokens": " ".join(f"{kind}={count}" for kind, count in row["tokens"].items()),
+         "erro": row["error"] or ""}
+        for row in trace["breakdown"]], hide_index=True)